@@ -1,29 +1,60 @@
+import collections
 import contextlib
 import datetime
 import functools
-import io
 import json
+import multiprocessing
 import os
+import queue
 import subprocess
 import tempfile
+import threading
 import time
 import traceback
-from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures import Future, ThreadPoolExecutor, wait
 from textwrap import indent
 
 import github
-import requests
 import ruamel.yaml
-import tqdm
-from requests.exceptions import RequestException
 
-from admin_migrations.defaults import DEBUG, MAX_MIGRATE, MAX_SECONDS, MAX_WORKERS
+from admin_migrations.checkpoint import CompletionCheckpoint
+from admin_migrations.context import FeedstockContext
+from admin_migrations.costs import API_STAGES, CHECKOUT_STAGES, FeedstockCosts
+from admin_migrations.defaults import (
+    DEBUG,
+    MAX_API_WORKERS,
+    MAX_MIGRATE,
+    MAX_SECONDS,
+    MAX_WORKERS,
+    MIRROR_DIR,
+    THREADS_PER_WORKER,
+)
+from admin_migrations.git_commands import run_git
+from admin_migrations.github_users import prune_user_cache
+from admin_migrations.http_cache import (
+    get_github_session,
+    install_http_cache,
+    prune_http_cache,
+)
 from admin_migrations.migrators import (
     CondaForgeYAMLTest,
     RAutomerge,
     TeamsCleanup,
 )
-from admin_migrations.migrators.base import Migrator
+from admin_migrations.migrators.base import compact_journal
+from admin_migrations.mirrors import clone_from_mirror, evict_mirrors
+from admin_migrations.output import capture_output
+from admin_migrations.pool import ThreadedProcessPool
+from admin_migrations.rate_limit import RateLimiter, install_rate_limiter
+from admin_migrations.repo_metadata import (
+    get_repo_metadata,
+    load_repo_metadata,
+    read_repo_metadata,
+    repo_is_archived,
+    repo_metadata_from_repo,
+    write_repo_metadata,
+)
+from admin_migrations.scheduler import WorkScheduler
 
 MIGRATORS = [
     RAutomerge(),
@@ -32,6 +63,23 @@ MIGRATORS = [
 ]
 N_WORKERS = None
 
+# the driver only migrates feedstocks with one of these recipes
+RECIPE_PATHS = [
+    "recipe/meta.yaml",
+    "recipe/recipe/meta.yaml",
+    # This is a rattler-build recipe
+    "recipe/recipe.yaml",
+]
+
+# migrators by name in a worker process, filled by _init_worker
+_WORKER_MIGRATORS = {}
+# semaphores shared by all workers that bound how many migrate calls can run
+# at once for migrators with a max_processes below the pool size
+_MIGRATOR_LANES = {}
+# held by migrators that need the feedstock as the working directory, which is
+# shared by all of the threads of a process
+_CWD_LOCK = threading.Lock()
+
 
 @functools.lru_cache(maxsize=1)
 def _get_max_migrate():
@@ -53,28 +101,6 @@ def _assert_at_0():
 _assert_at_0()
 
 
-@functools.lru_cache(maxsize=20000)
-def _get_repo_is_archived(feedstock):
-    headers = {
-        "authorization": "Bearer %s" % os.environ["GITHUB_TOKEN"],
-        "content-type": "application/json",
-    }
-    r = requests.get(
-        "https://api.github.com/repos/conda-forge/%s-feedstock" % feedstock,
-        headers=headers,
-    )
-    return r.json()["archived"]
-
-
-def _repo_is_archived(feedstock):
-    for _ in range(10):
-        try:
-            return _get_repo_is_archived(feedstock)
-        except (json.JSONDecodeError, RequestException):
-            pass
-    return None
-
-
 # https://stackoverflow.com/questions/6194499/pushd-through-os-system
 @contextlib.contextmanager
 def pushd(new_dir):
@@ -86,125 +112,579 @@ def pushd(new_dir):
         os.chdir(previous_dir)
 
 
-def _run_git_command(args, check=True):
-    s = subprocess.run(
-        ["git"] + args,
-        stdout=subprocess.PIPE,
-        stderr=subprocess.STDOUT,
+def _get_remote_branches(feedstock_http):
+    """List the branches of a feedstock without cloning it.
+
+    Returns the default branch and all of the branches with the default one
+    first, or None if the remote could not be listed.
+    """
+    ok, out = run_git(
+        ["ls-remote", "--symref", feedstock_http, "HEAD", "refs/heads/*"],
+        check=False,
     )
-    if s.returncode != 0 and not check:
-        print(f"    ERROR: {s.stdout.decode('utf-8')}", flush=True)
-    if check:
-        s.check_returncode()
-    return s.returncode == 0, s.stdout.decode("utf-8")
-
-
-def _get_curr_branch():
-    o = subprocess.run(
-        ["git", "rev-parse", "--abbrev-ref", "HEAD"],
-        check=True,
-        stdout=subprocess.PIPE,
-        stderr=subprocess.STDOUT,
+    if not ok:
+        return None
+
+    default_branch = None
+    branches = []
+    for line in out.splitlines():
+        if line.startswith("ref: refs/heads/") and line.endswith("\tHEAD"):
+            default_branch = line[len("ref: refs/heads/") : -len("\tHEAD")]
+        elif "\trefs/heads/" in line:
+            branches.append(line.split("\trefs/heads/", 1)[1])
+    if default_branch is None:
+        return None
+
+    return default_branch, [default_branch] + sorted(
+        br for br in branches if br != default_branch
     )
-    return o.stdout.decode("utf=8").strip()
 
 
-def _get_branches(default_branch):
-    o = subprocess.run(
-        ["git", "branch", "-r"],
-        check=True,
-        stdout=subprocess.PIPE,
-        stderr=subprocess.STDOUT,
-    )
+def _has_work(feedstock, migrators, default_branch, branches):
+    for branch in branches:
+        for m in migrators:
+            if branch != default_branch and m.main_branch_only:
+                continue
+            if not m.skip(feedstock, branch):
+                return True
+    return False
 
-    branches = set()
-    for line in o.stdout.decode("utf-8").split("\n"):
-        if len(line) > 0 and "origin/HEAD" not in line:
-            _branch = line.strip()[len("origin/") :]
-            if _branch != default_branch:
-                branches |= set([_branch])
-    return [default_branch] + [br for br in branches]
 
+# how far back an incremental listing of the org looks before the last one to
+# allow for clock skew and slow API replication
+LISTING_SLACK = 10 * 60
 
-def _get_all_feedstocks():
-    gh = github.Github(os.environ["GITHUB_TOKEN"], per_page=100)
-    org = gh.get_organization("conda-forge")
+
+def _feedstock_name(repo):
+    # special casing for weird renaming in the api
+    if repo.name == "numpy-sugar-feedstock":
+        name = "numpy_sugar-feedstock"
+    else:
+        name = repo.name
+    return name[: -len("-feedstock")]
+
+
+def _split_feedstocks(metadata):
     archived = set()
     not_archived = set()
+    for name, md in metadata.items():
+        if md["archived"]:
+            archived.add(name)
+        else:
+            not_archived.add(name)
+    return {"active": sorted(list(not_archived)), "archived": sorted(list(archived))}
+
+
+def _get_all_feedstocks(on_feedstock=None):
+    gh = github.Github(os.environ["GITHUB_TOKEN"], per_page=100)
+    org = gh.get_organization("conda-forge")
+    metadata = {}
+    listed_at = time.time()
     repos = org.get_repos(type="public")
-    for r in tqdm.tqdm(repos, total=org.public_repos, desc="getting all feedstocks"):
+    for r in repos:
         if r.name.endswith("-feedstock"):
-            # special casing for weird renaming in the api
-            if r.name == "numpy-sugar-feedstock":
-                name = "numpy_sugar-feedstock"
-            else:
-                name = r.name
+            name = _feedstock_name(r)
+            metadata[name] = repo_metadata_from_repo(r)
+            if on_feedstock is not None:
+                on_feedstock(name, metadata[name])
 
-            if r.archived:
-                archived.add(name[: -len("-feedstock")])
-            else:
-                not_archived.add(name[: -len("-feedstock")])
+    print("listed %d feedstocks" % len(metadata), flush=True)
+    _write_listing(write_repo_metadata, metadata, listed_at)
 
-    return {"active": sorted(list(not_archived)), "archived": sorted(list(archived))}
+    return _split_feedstocks(metadata)
 
 
-def _load_feedstock_data():
+def _update_all_feedstocks(snapshot, on_feedstock=None):
+    """Update the last listing of the org with the repos changed since.
+
+    Archiving, renaming or creating a repo bumps its updated_at and pushes
+    bump its pushed_at, so we walk the repos newest first by each and stop at
+    the last listing. Deleted repos are only dropped by a full listing.
+    """
+    gh = github.Github(os.environ["GITHUB_TOKEN"], per_page=100)
+    org = gh.get_organization("conda-forge")
+    metadata = dict(snapshot["repos"])
+    listed_at = time.time()
+    since = snapshot["updated_at"] - LISTING_SLACK
+    changed = set()
+    for sort in ["updated", "pushed"]:
+        repos = org.get_repos(type="public", sort=sort, direction="desc")
+        for r in repos:
+            changed_at = getattr(r, "%s_at" % sort)
+            if changed_at is None or changed_at.timestamp() < since:
+                break
+            if r.name.endswith("-feedstock"):
+                name = _feedstock_name(r)
+                metadata[name] = repo_metadata_from_repo(r)
+                changed.add(name)
+                if on_feedstock is not None:
+                    on_feedstock(name, metadata[name])
+
+    print("updated %d feedstocks in the listing" % len(changed), flush=True)
+    _write_listing(write_repo_metadata, metadata, listed_at)
+
+    return _split_feedstocks(metadata)
+
+
+# the listing can run in a thread that outlives the time it is waited for, so
+# its writes to the data files are dropped once the listing is stopped
+_LISTING_LOCK = threading.Lock()
+_LISTING_STOPPED = threading.Event()
+
+
+def _write_listing(write, *args):
+    with _LISTING_LOCK:
+        if not _LISTING_STOPPED.is_set():
+            write(*args)
+
+
+def _stop_listing():
+    """Stop the listing from writing the data files, e.g. before they are
+    committed."""
+    with _LISTING_LOCK:
+        _LISTING_STOPPED.set()
+
+
+def _write_all_feedstocks(all_feedstocks):
+    with open("data/all_feedstocks.json.tmp", "w") as fp:
+        json.dump(all_feedstocks, fp, indent=2, sort_keys=True)
+    os.replace("data/all_feedstocks.json.tmp", "data/all_feedstocks.json")
+
+
+def _list_all_feedstocks(on_feedstock=None):
+    """List the feedstocks in the org, calling on_feedstock(name, metadata)
+    for each listed one as the pages arrive."""
     curr_hour = datetime.datetime.utcnow().hour
-    if (
-        curr_hour % 6 == 0 or not os.path.exists("data/all_feedstocks.json")
-    ) and not DEBUG:
+    snapshot = read_repo_metadata()
+    if curr_hour == 0 or snapshot is None:
+        # a full listing once a day drops deleted repos
+        all_feedstocks = _get_all_feedstocks(on_feedstock=on_feedstock)
+    else:
+        all_feedstocks = _update_all_feedstocks(snapshot, on_feedstock=on_feedstock)
+
+    _write_listing(_write_all_feedstocks, all_feedstocks)
+
+    return all_feedstocks
+
+
+def _load_feedstock_data():
+    """Load the list of feedstocks.
+
+    Returns the checkpoint and whether the list still has to be refreshed
+    with `_start_listing`. Without a cached list, we have to wait for the
+    listing.
+    """
+    global MAX_SECONDS
+
+    if not os.path.exists("data/all_feedstocks.json"):
         dt = time.time()
-        all_feedstocks = _get_all_feedstocks()
+        all_feedstocks = _list_all_feedstocks()
         dt = time.time() - dt
         print(" ", flush=True)
 
         # we run a bit less since this takes a few minutes
-        global MAX_SECONDS
         MAX_SECONDS -= dt
 
-        with open("data/all_feedstocks.json", "w") as fp:
-            json.dump(all_feedstocks, fp, indent=2, sort_keys=True)
-    else:
-        print("using cached feedstock list", flush=True)
-        print(" ", flush=True)
-        with open("data/all_feedstocks.json") as fp:
-            all_feedstocks = json.load(fp)
+        return CompletionCheckpoint(all_feedstocks["active"]), False
 
-    feedstocks = all_feedstocks["active"]
+    print("using cached feedstock list while refreshing it", flush=True)
+    print(" ", flush=True)
+    with open("data/all_feedstocks.json") as fp:
+        all_feedstocks = json.load(fp)
 
-    if not os.path.exists("data/feedstocks.json"):
-        blob = {"current_feedstock": feedstocks[0]}
-    else:
-        with open("data/feedstocks.json") as fp:
-            blob = json.load(fp)
+    return CompletionCheckpoint(all_feedstocks["active"]), True
+
+
+def _start_listing():
+    """Refresh the list of feedstocks in a background thread.
+
+    The thread is a daemon so that a listing that runs past the deadline
+    does not keep the run alive. Start it only after the worker processes
+    are forked, since forking a process with running threads can deadlock
+    the children.
+
+    Returns a future for the new list of feedstocks and a queue of
+    (name, metadata) for each listed feedstock, ended by None.
+    """
+    listing = Future()
+    listed = queue.SimpleQueue()
+
+    def _list():
+        try:
+            listing.set_result(
+                _list_all_feedstocks(
+                    on_feedstock=lambda name, md: listed.put((name, md))
+                )
+            )
+        except Exception as e:
+            listing.set_exception(e)
+        finally:
+            listed.put(None)
 
-    blob["feedstocks"] = sorted(feedstocks)
+    threading.Thread(target=_list, daemon=True).start()
 
-    return blob
+    return listing, listed
 
 
 def _commit_data():
     print("\nsaving data...", flush=True)
-    _run_git_command(["add", "README.md"])
-    _run_git_command(["add", "data/*.json"])
-    _run_git_command(["stash"])
-    _run_git_command(["pull", "--quiet"])
-    _run_git_command(["stash", "pop"])
-    _run_git_command(["add", "README.md"])
-    _run_git_command(["add", "data/*.json"])
-    _run_git_command(["commit", "-m", "[ci skip] data for admin migration run"])
-    _run_git_command(["push", "--quiet"])
+    compact_journal()
+    run_git(["add", "README.md"])
+    run_git(["add", "data/*.json"])
+    run_git(["stash"])
+    run_git(["pull", "--quiet"])
+    run_git(["stash", "pop"])
+    run_git(["add", "README.md"])
+    run_git(["add", "data/*.json"])
+    run_git(["commit", "-m", "[ci skip] data for admin migration run"])
+    run_git(["push", "--quiet"])
+
+
+def _get_sparse_paths(migrators):
+    """Get the paths to check out for a set of migrators.
+
+    Returns None if any of the migrators needs the full working tree.
+    """
+    paths = set(RECIPE_PATHS)
+    for m in migrators:
+        if m.checkout_paths is None:
+            return None
+        paths |= set(m.checkout_paths)
+    return sorted(paths)
+
+
+def _clone_feedstock(feedstock, feedstock_http, migrators, cwd):
+    """Clone the feedstock into cwd.
+
+    Only the tip of the default branch is cloned if all of the migrators
+    run on the default branch only. Otherwise all branches are cloned and
+    file contents are fetched lazily as branches are checked out. If the
+    migrators declare the paths they need, only those are checked out.
+    """
+    dest = os.path.join(cwd, "%s-feedstock" % feedstock)
+    sparse_paths = _get_sparse_paths(migrators)
+
+    clone_args = []
+    if sparse_paths is not None:
+        clone_args.append("--no-checkout")
+
+    if MIRROR_DIR is not None:
+        clone_from_mirror(feedstock, feedstock_http, dest, clone_args=clone_args)
+    else:
+        if all(m.main_branch_only for m in migrators):
+            clone_args += ["--single-branch", "--depth=1"]
+        else:
+            clone_args += ["--filter=blob:none"]
+        run_git(["clone", "--quiet"] + clone_args + [feedstock_http, dest])
+
+    if sparse_paths is not None:
+        run_git(
+            ["sparse-checkout", "set", "--no-cone"]
+            + ["/" + pth for pth in sparse_paths],
+            cwd=dest,
+        )
+        run_git(["checkout", "--quiet"], cwd=dest)
+
+
+def _plan_migrators(feedstock, migrators):
+    """Return the migrators that still have work to do for a feedstock.
+
+    This check runs in the parent process before anything is cloned. Branches
+    are only discovered once a feedstock is cloned, so only migrators that run
+    on the default branch alone can be skipped here. The others are checked
+    against the branches of the feedstock by the worker.
+    """
+    pending = []
+    for m in migrators:
+        if not m.main_branch_only or not m.skip(feedstock, "main"):
+            pending.append(m)
+    return pending
+
+
+def _forget_feedstocks(migrators, feedstocks):
+    for m in migrators:
+        for fs in feedstocks:
+            if fs in m._done_table:
+                del m._done_table[fs]
+
+
+def _make_migrator_lanes(migrators, n_workers):
+    lanes = {}
+    for m in migrators:
+        if 0 < m.max_processes < n_workers:
+            lanes[m.__class__.__name__] = multiprocessing.BoundedSemaphore(
+                m.max_processes
+            )
+    return lanes
+
+
+def _init_worker(forgotten_feedstocks, lanes, rate_limiter):
+    """Register the migrators, their lanes and the GitHub rate limit governor
+    once per worker process.
+
+    Tasks only carry the feedstock and the names of the migrators to run so
+    that the done tables are not pickled for every feedstock.
+    """
+    _WORKER_MIGRATORS.clear()
+    for m in MIGRATORS:
+        _WORKER_MIGRATORS[m.__class__.__name__] = m
+    _forget_feedstocks(MIGRATORS, forgotten_feedstocks)
+
+    _MIGRATOR_LANES.clear()
+    _MIGRATOR_LANES.update(lanes)
+
+    install_rate_limiter(rate_limiter)
+    install_http_cache()
+    load_repo_metadata()
+
+
+def _list_dir(feedstock, branch, pth):
+    """List the names in a directory of a feedstock with the contents API."""
+    r = get_github_session().get(
+        "https://api.github.com/repos/conda-forge/%s-feedstock/contents/%s"
+        % (feedstock, pth),
+        params={"ref": branch},
+        headers={"Authorization": "bearer %s" % os.environ["GITHUB_TOKEN"]},
+    )
+    if r.status_code == 404:
+        return []
+    r.raise_for_status()
+    if not isinstance(r.json(), list):
+        # a file
+        return []
+    return [entry["name"] for entry in r.json()]
+
+
+def _has_recipe(feedstock, branch):
+    """Check for one of RECIPE_PATHS on a branch of a feedstock without
+    cloning it."""
+    listed = {}
+    for pth in RECIPE_PATHS:
+        dirname, fname = os.path.split(pth)
+        if dirname not in listed:
+            parent, name = os.path.split(dirname)
+            if parent and name not in listed.get(parent, []):
+                # no need to ask for a directory we know is not there
+                listed[dirname] = []
+            else:
+                listed[dirname] = _list_dir(feedstock, branch, dirname)
+        if fname in listed[dirname]:
+            return True
+    return False
+
+
+def _migrate_without_checkout(feedstock, default_branch, migrators):
+    """Run the migrators that do not need a checkout on the default branch.
+
+    Returns whether any API calls were made, the migrations to record, the
+    exit code and whether the output should be printed.
+    """
+    made_api_calls = False
+    migrators_to_record = []
+    exit_code = 0
+    print_buff = False
+    for m in migrators:
+        print("migrator %s" % m.__class__.__name__, flush=True)
+
+        if m.skip(feedstock, default_branch):
+            continue
+
+        try:
+            with _MIGRATOR_LANES.get(m.__class__.__name__, contextlib.nullcontext()):
+                worked, _, _made_api_calls = m.migrate(
+                    feedstock, default_branch, FeedstockContext(feedstock)
+                )
+            made_api_calls = made_api_calls or _made_api_calls
+        except Exception as e:
+            print_buff = True
+
+            worked = False
+            _print_error(e)
+
+        if worked:
+            print_buff = True
+            migrators_to_record.append((m.__class__.__name__, default_branch))
+        elif worked is None:
+            # queued for the migrator's flush, which records it
+            print_buff = True
+        elif not m.continual:
+            print_buff = True
+            exit_code = 1
+
+    return made_api_calls, migrators_to_record, exit_code, print_buff
+
+
+def _migrate_with_recipe_check(feedstock, default_branch, migrators):
+    """Run the migrators that do not need a checkout if the feedstock has a
+    recipe, like `_migrate_without_checkout`."""
+    if all(m.skip(feedstock, default_branch) for m in migrators):
+        return False, [], 0, False
+
+    try:
+        has_recipe = _has_recipe(feedstock, default_branch)
+    except Exception as e:
+        print("    could not check for a recipe!", flush=True)
+        _print_error(e)
+        return False, [], 1, True
+
+    if not has_recipe:
+        # same as in run_migrators, feedstocks without a recipe are left
+        # alone
+        return False, [], 0, False
+
+    return _migrate_without_checkout(feedstock, default_branch, migrators)
+
+
+def run_api_migrators(
+    feedstock, migrator_names, default_branch=None
+) -> tuple[bool, list[tuple[str, str]], int, dict[str, float]]:
+    """Run migrators that do not need a checkout of the feedstock.
+
+    These run on threads in the main process for feedstocks that no other
+    migrator needs to clone and are always called for the default branch,
+    which is looked up if not given. Like in run_migrators, feedstocks
+    without a recipe are left alone.
+    """
+    migrators = [_WORKER_MIGRATORS[name] for name in migrator_names]
+
+    _start = time.time()
+
+    with capture_output() as buff:
+        print("=" * 80, flush=True)
+        print("=" * 80, flush=True)
+        print("=" * 80, flush=True)
+        print("migrating %s w/o a checkout" % feedstock, flush=True)
+
+        if default_branch is None:
+            md = get_repo_metadata(feedstock)
+            default_branch = md["default_branch"] if md is not None else None
+        if default_branch is None:
+            print("    could not get the default branch!", flush=True)
+            made_api_calls, migrators_to_record, exit_code, print_buff = (
+                False,
+                [],
+                1,
+                True,
+            )
+        else:
+            made_api_calls, migrators_to_record, exit_code, print_buff = (
+                _migrate_with_recipe_check(feedstock, default_branch, migrators)
+            )
 
+    if print_buff:
+        print(buff.getvalue(), flush=True)
 
-def run_migrators(feedstock, migrators) -> tuple[bool, list[tuple[Migrator, str]], int]:
-    if len(migrators) == 0:
-        return False, [], 0
+    return (
+        made_api_calls,
+        migrators_to_record,
+        exit_code,
+        {"api": time.time() - _start},
+    )
+
+
+def _switch_branch(ctx, branch):
+    try:
+        ctx.git(
+            ["switch", branch],
+            check=True,
+        )
+    except Exception:
+        ok, e = ctx.git(
+            [
+                "checkout",
+                "-b",
+                branch,
+                "-t",
+                "origin/" + branch,
+            ],
+            check=False,
+        )
+        if not ok:
+            raise RuntimeError("git branch checkout error: %s" % e)
+
+
+def _print_error(e):
+    print("    ERROR:", repr(e), flush=True)
+    print(indent("".join(traceback.format_exception(e)), "    "), flush=True)
+
+
+def _commit_migrations(ctx, messages):
+    """Commit the changes of all of the migrators on a branch at once.
+
+    Returns False without committing if the migrators left the files as
+    they were.
+    """
+    ctx.git(["add", "-u"])
+    if ctx.run(["git", "diff", "--cached", "--quiet"]).returncode == 0:
+        print("    no changes to commit", flush=True)
+        return False
+
+    if len(messages) == 1:
+        args = [
+            "-m",
+            "[ci skip] [skip ci] [cf admin skip] ***NO_CI*** %s" % messages[0],
+        ]
+    else:
+        args = [
+            "-m",
+            "[ci skip] [skip ci] [cf admin skip] ***NO_CI*** "
+            "%d admin migrations" % len(messages),
+            "-m",
+            "\n".join("- %s" % msg for msg in messages),
+        ]
+    ctx.git(["commit"] + args)
+    return True
+
+
+def _push_branches(ctx, branches, timings):
+    """Push the commits on all of the branches at once."""
+    _push_start = time.time()
+    is_archived = repo_is_archived(ctx.feedstock)
+    if is_archived is not None:
+        if not is_archived:
+            ctx.git(["push", "--quiet", "--atomic", "origin"] + branches)
+            timings["push"] += time.time() - _push_start
+        else:
+            print(
+                "not pushing to archived feedstock",
+                flush=True,
+            )
+    else:
+        print(
+            "could not get repo archived status - punting to next round",
+            flush=True,
+        )
+
+
+@contextlib.contextmanager
+def _migrator_cwd(m, ctx):
+    """Make the feedstock the working directory for migrators that need it."""
+    if m.needs_cwd:
+        with _CWD_LOCK, pushd(ctx.path):
+            yield
+    else:
+        yield
+
+
+def run_migrators(
+    feedstock, migrator_names
+) -> tuple[bool, list[tuple[str, str]], int, dict[str, float]]:
+    if len(migrator_names) == 0:
+        return False, [], 0, {}
+
+    migrators = [_WORKER_MIGRATORS[name] for name in migrator_names]
+    # the migrators that do not need a checkout run on the default branch
+    # of the clone, so the feedstock is not fetched twice
+    api_migrators = [m for m in migrators if not m.needs_checkout]
+    migrators = [m for m in migrators if m.needs_checkout]
 
     _start = time.time()
+    # seconds spent in each stage, see admin_migrations.costs
+    timings = {"clone": 0.0, "push": 0.0}
 
     made_api_calls = False
 
-    # this will be a set of tuples with the migrator class and the branch
+    # this will be a set of tuples with the migrator name and the branch
     migrators_to_record = []
 
     feedstock_http = (
@@ -215,158 +695,270 @@ def run_migrators(feedstock, migrators) -> tuple[bool, list[tuple[Migrator, str]
         )
     )
 
-    buff = io.StringIO()
-    print_buff = False
-
     exit_code = 0
+
+    # the migrators record their work per branch, so we can tell from the
+    # branches on the remote if there is anything to clone for, except for
+    # continual migrators which run every time
+    _clone_start = time.time()
+    remote_branches = None
+    if not any(m.continual for m in migrators):
+        remote_branches = _get_remote_branches(feedstock_http)
+    if remote_branches is not None and not _has_work(
+        feedstock, migrators, *remote_branches
+    ):
+        timings["clone"] = time.time() - _clone_start
+        timings["migrate"] = 0.0
+        if api_migrators:
+            made_api_calls, migrators_to_record, exit_code, _timings = (
+                run_api_migrators(
+                    feedstock,
+                    [m.__class__.__name__ for m in api_migrators],
+                    default_branch=remote_branches[0],
+                )
+            )
+            timings["migrate"] = _timings["api"]
+        return made_api_calls, migrators_to_record, exit_code, timings
+
+    print_buff = False
     with (
         tempfile.TemporaryDirectory() as tmpdir,
-        contextlib.redirect_stdout(buff),
-        contextlib.redirect_stderr(buff),
+        capture_output() as buff,
     ):
         print("=" * 80, flush=True)
         print("=" * 80, flush=True)
         print("=" * 80, flush=True)
         print("migrating %s" % feedstock, flush=True)
 
-        with pushd(tmpdir):
-            try:
-                # use a full depth clone since some migrators rely on
-                # having all of the branches
-                _run_git_command(["clone", "--quiet", feedstock_http])
-            except subprocess.CalledProcessError:
-                print("    clone failed!", flush=True)
-                return made_api_calls, migrators_to_record, 1
-
-            with pushd("%s-feedstock" % feedstock):
-                if (
-                    os.path.exists("recipe/meta.yaml")
-                    or os.path.exists("recipe/recipe/meta.yaml")
-                    # This is a rattler-build recipe
-                    or os.path.exists("recipe/recipe.yaml")
-                ):
-                    _run_git_command(
-                        [
-                            "remote",
-                            "set-url",
-                            "--push",
-                            "origin",
-                            feedstock_http,
-                        ]
-                    )
-
-                    default_branch = _get_curr_branch()
-                    branches = _get_branches(default_branch)
-
+        try:
+            _clone_feedstock(feedstock, feedstock_http, migrators, tmpdir)
+            timings["clone"] = time.time() - _clone_start
+        except subprocess.CalledProcessError:
+            print("    clone failed!", flush=True)
+            return made_api_calls, migrators_to_record, 1, {}
+
+        with FeedstockContext(
+            feedstock, os.path.join(tmpdir, "%s-feedstock" % feedstock)
+        ) as ctx:
+            if any(ctx.exists(pth) for pth in RECIPE_PATHS):
+                ctx.git(
+                    [
+                        "remote",
+                        "set-url",
+                        "--push",
+                        "origin",
+                        feedstock_http,
+                    ]
+                )
+
+                default_branch = ctx.default_branch
+                branches = ctx.branches
+
+                (
+                    made_api_calls,
+                    migrators_to_record,
+                    exit_code,
+                    print_buff,
+                ) = _migrate_without_checkout(feedstock, default_branch, api_migrators)
+
+                # the branches with a commit to push and the migrators
+                # that made them
+                to_push = {}
+
+                for branch in branches:
+                    if branch != default_branch and all(
+                        m.main_branch_only for m in migrators
+                    ):
+                        continue
+
+                    print("branch:", branch, flush=True)
+                    # the branch is only checked out once a migrator
+                    # cannot tell from the committed files that it has
+                    # nothing to do
+                    switched = False
+                    messages = []
+                    committers = []
                     for m in migrators:
-                        print("migrator %s" % m.__class__.__name__, flush=True)
+                        if branch != default_branch and m.main_branch_only:
+                            continue
 
-                        for branch in branches:
-                            if branch != default_branch and m.main_branch_only:
+                        print("    migrator %s" % m.__class__.__name__, flush=True)
+                        staged_tree = None
+
+                        try:
+                            if m.skip(feedstock, branch):
                                 continue
 
-                            try:
-                                print("    branch:", branch, flush=True)
-                                try:
-                                    _run_git_command(
-                                        ["switch", branch],
-                                        check=True,
-                                    )
-                                except Exception:
-                                    ok, e = _run_git_command(
-                                        [
-                                            "checkout",
-                                            "-b",
-                                            branch,
-                                            "-t",
-                                            "origin/" + branch,
-                                        ],
-                                        check=False,
+                            # once a migrator has changed the working tree
+                            # the committed files are out of date
+                            result = None
+                            if not switched:
+                                result = m.check(feedstock, branch, ctx)
+                            if result is not None:
+                                worked, _, _made_api_calls = result
+                                made_api_calls = made_api_calls or _made_api_calls
+                            else:
+                                if not switched:
+                                    _switch_branch(ctx, branch)
+                                    switched = True
+
+                                # the changes staged by the migrators before
+                                # this one, so that a failed migrator can be
+                                # undone
+                                _, staged_tree = ctx.git(["write-tree"])
+
+                                with (
+                                    _MIGRATOR_LANES.get(
+                                        m.__class__.__name__, contextlib.nullcontext()
+                                    ),
+                                    _migrator_cwd(m, ctx),
+                                ):
+                                    worked, commit_me, _made_api_calls = m.migrate(
+                                        feedstock, branch, ctx
                                     )
-                                    if not ok:
-                                        raise RuntimeError(
-                                            "git branch checkout error: %s" % e
-                                        )
-
-                                if m.skip(feedstock, branch):
-                                    continue
-
-                                worked, commit_me, _made_api_calls = m.migrate(
-                                    feedstock, branch
-                                )
                                 made_api_calls = made_api_calls or _made_api_calls
 
                                 if commit_me:
                                     print_buff = True
-
-                                    _run_git_command(
-                                        [
-                                            "commit",
-                                            "--allow-empty",
-                                            "-am",
-                                            "[ci skip] [skip ci] [cf admin skip] "
-                                            "***NO_CI*** %s" % m.message(),
-                                        ]
-                                    )
-
-                                    made_api_calls = True
-                                    is_archived = _repo_is_archived(feedstock)
-                                    if is_archived is not None:
-                                        if not is_archived:
-                                            _run_git_command(["push", "--quiet"])
-                                        else:
-                                            print(
-                                                "not pushing to archived feedstock",
-                                                flush=True,
-                                            )
-                                    else:
-                                        print(
-                                            "could not get repo archived status - "
-                                            "punting to next round",
-                                            flush=True,
-                                        )
-
-                            except Exception as e:
-                                print_buff = True
-
-                                worked = False
-                                print("    ERROR:", repr(e), flush=True)
-                                print(
-                                    indent(
-                                        "".join(
-                                            traceback.format_exception(
-                                                e,
-                                            )
-                                        ),
-                                        "    ",
-                                    ),
-                                    flush=True,
+                                    ctx.git(["add", "-u"])
+                                    messages.append(m.message())
+                                    committers.append(m.__class__.__name__)
+
+                        except Exception as e:
+                            print_buff = True
+
+                            worked = False
+                            _print_error(e)
+                            if staged_tree is not None:
+                                ctx.git(
+                                    [
+                                        "read-tree",
+                                        "-u",
+                                        "--reset",
+                                        staged_tree.strip(),
+                                    ],
+                                    check=False,
                                 )
-
-                            if worked:
-                                print_buff = True
-                                migrators_to_record.append((m, branch))
-                            elif not m.continual:
-                                print_buff = True
+                                # and the files it created without adding them
+                                ctx.git(["clean", "--quiet", "-fd"], check=False)
+
+                        if worked:
+                            print_buff = True
+                            migrators_to_record.append((m.__class__.__name__, branch))
+                        elif worked is None:
+                            # queued for the migrator's flush, which records it
+                            print_buff = True
+                        elif not m.continual:
+                            print_buff = True
+                            exit_code = 1
+
+                    try:
+                        if messages and _commit_migrations(ctx, messages):
+                            to_push[branch] = committers
+                    except Exception as e:
+                        print_buff = True
+                        _print_error(e)
+                        # drop the changes so the next branch can be
+                        # switched to, the migrators run again next time
+                        ctx.git(["reset", "--quiet", "--hard"], check=False)
+                        for name in committers:
+                            if (name, branch) in migrators_to_record:
+                                migrators_to_record.remove((name, branch))
+                            if not _WORKER_MIGRATORS[name].continual:
                                 exit_code = 1
 
+                if to_push:
+                    made_api_calls = True
+                    try:
+                        _push_branches(ctx, list(to_push), timings)
+                    except Exception as e:
+                        print_buff = True
+                        _print_error(e)
+                        # nothing was pushed, so the migrators that made
+                        # commits have to run again
+                        for branch, names in to_push.items():
+                            for name in names:
+                                if (name, branch) in migrators_to_record:
+                                    migrators_to_record.remove((name, branch))
+                                if not _WORKER_MIGRATORS[name].continual:
+                                    exit_code = 1
+
         print("migration took %s seconds" % (time.time() - _start), flush=True)
         print(" ", flush=True)
 
     if print_buff:
         print(buff.getvalue(), flush=True)
 
-    return made_api_calls, migrators_to_record, exit_code
+    timings["migrate"] = time.time() - _start - timings["clone"] - timings["push"]
+    return made_api_calls, migrators_to_record, exit_code, timings
+
+
+def _get_tasks(pending):
+    """Split the pending migrators for a feedstock into tasks per lane.
+
+    Migrators that do not need a checkout only get a task in the API lane if
+    the feedstock is not cloned for another migrator.
+
+    Returns a dict mapping the lane to the function to run, the names of the
+    migrators and the stages timed by the cost model.
+    """
+    tasks = {}
+    names = [m.__class__.__name__ for m in pending]
+    if any(m.needs_checkout for m in pending):
+        # the migrators without a checkout run on the clone's default branch
+        tasks["checkout"] = (run_migrators, names, CHECKOUT_STAGES)
+    elif names:
+        tasks["api"] = (run_api_migrators, names, API_STAGES)
+    return tasks
+
+
+def _pack_feedstocks(plans, costs, lane_budgets):
+    """Pick the next feedstocks whose expected cost fits in each lane's
+    budget of worker-seconds.
+
+    The picked feedstocks are ordered so that the slowest ones start first
+    and do not straggle at the deadline. Feedstocks with nothing to do come
+    first since they cost nothing.
+    """
+    totals = {lane: 0.0 for lane in lane_budgets}
+    work = []
+    for f, pending in plans.items():
+        tasks = _get_tasks(pending)
+        expected = {
+            lane: costs.expected(f, stages) for lane, (_, _, stages) in tasks.items()
+        }
+        if any(
+            totals[lane] > 0 and totals[lane] + cost > lane_budgets[lane]
+            for lane, cost in expected.items()
+        ):
+            break
+        for lane, cost in expected.items():
+            totals[lane] += cost
+        work.append((f, tasks, expected))
+
+    return sorted(work, key=lambda w: (len(w[1]) > 0, -max(w[2].values(), default=0)))
+
+
+def _flush_migrators(migrators, final=False):
+    for m in migrators:
+        try:
+            m.flush(final=final)
+        except Exception as e:
+            print(
+                "ERROR: could not flush migrator %s" % m.__class__.__name__,
+                flush=True,
+            )
+            _print_error(e)
 
 
 def _report_progress(
-    num_done_prev, num_done, feedstocks, num_pushed_or_apied, start_time
+    num_done_prev, num_done, checkpoint, num_pushed_or_apied, start_time
 ):
     print(
         "on %d out of %d feedstocks"
         % (
             num_done_prev + num_done,
-            len(feedstocks["feedstocks"]),
+            len(checkpoint.feedstocks),
         ),
         flush=True,
     )
@@ -438,33 +1030,33 @@ def main() -> int:
 
     print(" ", flush=True)
 
-    feedstocks = _load_feedstock_data()
+    # all GitHub API requests of this run share one rate limit budget
+    rate_limiter = RateLimiter()
+    install_rate_limiter(rate_limiter)
+    install_http_cache()
 
     if DEBUG:
         # set DEBUG_ADMIN_MIGRATIONS in your env to enable this
         all_feedstocks = ["cf-autotick-bot-test-package"]
-        feedstocks["feedstocks"] = all_feedstocks
-        feedstocks["current_feedstock"] = "a"
-        assert feedstocks["feedstocks"][0] > feedstocks["current_feedstock"]
-        for m in MIGRATORS:
-            for fs in all_feedstocks:
-                if fs in m._done_table:
-                    del m._done_table[fs]
+        checkpoint = CompletionCheckpoint(all_feedstocks, fname=None)
+        _forget_feedstocks(MIGRATORS, all_feedstocks)
+        forgotten_feedstocks = all_feedstocks
+        refresh_listing = False
     else:
-        all_feedstocks = feedstocks["feedstocks"]
+        checkpoint, refresh_listing = _load_feedstock_data()
+        all_feedstocks = checkpoint.feedstocks
+        forgotten_feedstocks = []
 
-    num_done_prev = sum(
-        1 if fs <= feedstocks["current_feedstock"] else 0
-        for fs in feedstocks["feedstocks"]
-    )
+    num_done_prev = checkpoint.num_done
+    listing, listed = None, None
 
-    n_workers = min([m.max_processes for m in MIGRATORS])
-    if n_workers <= 0:
-        n_workers = os.environ.get("CPU_COUNT", MAX_WORKERS)
-        try:
-            n_workers = int(n_workers)
-        except Exception:
-            n_workers = MAX_WORKERS
+    # the git and file work runs at full width, each migrator's
+    # max_processes is enforced separately by its lane
+    n_workers = os.environ.get("CPU_COUNT", MAX_WORKERS)
+    try:
+        n_workers = int(n_workers)
+    except Exception:
+        n_workers = MAX_WORKERS
 
     if n_workers <= 0:
         n_workers = MAX_WORKERS
@@ -476,104 +1068,239 @@ def main() -> int:
         n_workers = MAX_WORKERS
 
     N_WORKERS = n_workers
+    # each worker process migrates several feedstocks at once on threads
+    n_threads = 1 if DEBUG else THREADS_PER_WORKER
+    n_checkout_workers = n_workers * n_threads
+    n_api_workers = 1 if DEBUG else MAX_API_WORKERS
+    lanes = _make_migrator_lanes(MIGRATORS, max(n_checkout_workers, n_api_workers))
+
+    plans = {}
+    for f in all_feedstocks:
+        if not checkpoint.is_done(f):
+            plans[f] = _plan_migrators(f, MIGRATORS)
+    print(
+        "planned %d feedstocks with pending work out of %d remaining"
+        % (sum(1 for pending in plans.values() if pending), len(plans)),
+        flush=True,
+    )
+    print(" ", flush=True)
 
     num_done = 0
+    num_skipped = 0
     num_pushed_or_apied = 0
     exit_code = 0
     start_time = time.time()
     report_time = time.time()
-    futs = {}
-    finished_feedstocks = []
-    with ProcessPoolExecutor(max_workers=n_workers) as exec:
-        for f in all_feedstocks:
-            # did we do this one?
-            if f <= feedstocks["current_feedstock"]:
-                continue
+    # number of lanes still running for a feedstock and whether any of them
+    # made API calls or pushed
+    tasks_left = {}
+    pushed_or_apied = {}
+    migrators_by_name = {m.__class__.__name__: m for m in MIGRATORS}
+    scheduler = WorkScheduler(start_time + MAX_SECONDS)
+    costs = FeedstockCosts()
+    # we allow a bit of slack since the scheduler stops in time anyways
+    work = _pack_feedstocks(
+        plans,
+        costs,
+        {
+            "checkout": 1.25 * MAX_SECONDS * n_checkout_workers,
+            "api": 1.25 * MAX_SECONDS * n_api_workers,
+        },
+    )
+    print(
+        "packed %d feedstocks into this run's time budget" % len(work),
+        flush=True,
+    )
+    print(" ", flush=True)
+    work = collections.deque(work)
+    # feedstocks the listing found archived since the cached list
+    newly_archived = set()
+
+    def _handle_listed():
+        # new feedstocks go to the front of the queue, archived ones are
+        # dropped if they did not start yet
+        while listed is not None:
+            try:
+                item = listed.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                break
 
-            # migrate
-            if len(futs) >= n_workers:
-                for fut in as_completed(futs):
-                    made_api_call, migrations_to_record, migrator_exit_code = (
-                        fut.result()
+            f, md = item
+            if md["archived"]:
+                newly_archived.add(f)
+            elif f not in checkpoint:
+                print("found new feedstock %s" % f, flush=True)
+                checkpoint.set_feedstocks(checkpoint.feedstocks + [f])
+                plans[f] = _plan_migrators(f, MIGRATORS)
+                tasks = _get_tasks(plans[f])
+                work.appendleft(
+                    (
+                        f,
+                        tasks,
+                        {
+                            lane: costs.expected(f, stages)
+                            for lane, (_, _, stages) in tasks.items()
+                        },
                     )
-                    if made_api_call:
-                        num_pushed_or_apied += 1
-                    finished_feedstocks.append(futs[fut])
-                    num_done += 1
-                    if migrator_exit_code:
-                        exit_code = 1
-
-                    for _m, _branch in migrations_to_record:
-                        _m.record(futs[fut], _branch)
-
-                    if time.time() - report_time > 10:
-                        report_time = time.time()
-                        _report_progress(
-                            num_done_prev,
-                            num_done,
-                            feedstocks,
-                            num_pushed_or_apied,
-                            start_time,
-                        )
-                        print(
-                            "# of feedstocks running|n_workers: %s|%s"
-                            % (len(futs), n_workers),
-                            flush=True,
-                        )
-                        print(" ", flush=True)
+                )
+
+    def _handle_result(item):
+        nonlocal num_done, num_pushed_or_apied, exit_code, report_time
+
+        _, f, result, _ = item
+        made_api_call, migrations_to_record, migrator_exit_code, timings = result
+        costs.update(f, timings)
+        pushed_or_apied[f] = pushed_or_apied.get(f, False) or made_api_call
+        if migrator_exit_code:
+            exit_code = 1
+
+        for _name, _branch in migrations_to_record:
+            migrators_by_name[_name].record(f, _branch)
+
+        tasks_left[f] -= 1
+        if tasks_left[f] == 0:
+            checkpoint.mark_done(f)
+            num_done += 1
+            if pushed_or_apied[f]:
+                num_pushed_or_apied += 1
 
+        if time.time() - report_time > 10:
+            report_time = time.time()
+            checkpoint.save()
+            _flush_migrators(MIGRATORS)
+            _report_progress(
+                num_done_prev + num_skipped,
+                num_done,
+                checkpoint,
+                num_pushed_or_apied,
+                start_time,
+            )
+            print(
+                "# of feedstocks running|n_workers|n_threads|n_api_workers: "
+                "%s|%s|%s|%s"
+                % (scheduler.num_in_flight, n_workers, n_threads, n_api_workers),
+                flush=True,
+            )
+            print(" ", flush=True)
+
+    # the migrators that do not need a checkout run on threads in this process
+    _init_worker(forgotten_feedstocks, lanes, rate_limiter)
+    with (
+        ThreadedProcessPool(
+            max_workers=n_workers,
+            threads_per_worker=n_threads,
+            initializer=_init_worker,
+            initargs=(forgotten_feedstocks, lanes, rate_limiter),
+        ) as exec,
+        ThreadPoolExecutor(max_workers=n_api_workers) as api_exec,
+    ):
+        scheduler.add_lane("checkout", exec, n_checkout_workers)
+        scheduler.add_lane("api", api_exec, n_api_workers)
+
+        # the workers are forked by now
+        if refresh_listing:
+            listing, listed = _start_listing()
+
+        while True:
+            # the listing puts everything it finds before it is done
+            listing_done = listing is None or listing.done()
+            _handle_listed()
+            if not work:
+                # the listing can still find new feedstocks while there is
+                # time left
+                if listing_done or time.time() >= scheduler.deadline:
                     break
+                wait([listing], timeout=1)
+                while (item := scheduler.next_result(block=False)) is not None:
+                    _handle_result(item)
+                continue
 
-                del futs[fut]
+            f, tasks, expected = work.popleft()
+            if f in newly_archived:
+                continue
+
+            # nothing to do for this one?
+            if not tasks:
+                checkpoint.mark_done(f)
+                num_skipped += 1
+                continue
 
-            fut = exec.submit(run_migrators, f, MIGRATORS)
-            futs[fut] = f
+            # wait for room in the lanes we need
+            while not all(scheduler.has_room(lane) for lane in tasks):
+                _handle_result(scheduler.next_result())
 
             # out of time?
-            if time.time() - start_time > MAX_SECONDS:
+            if not all(scheduler.fits(lane, cost) for lane, cost in expected.items()):
+                print("not enough time left for more feedstocks", flush=True)
                 break
 
+            # migrate
+            tasks_left[f] = len(tasks)
+            for lane, (fn, names, _) in tasks.items():
+                scheduler.submit(lane, f, fn, f, names)
+
+            while (item := scheduler.next_result(block=False)) is not None:
+                _handle_result(item)
+
             # did too many?
             if num_pushed_or_apied >= _get_max_migrate():
                 break
 
         # clean up
-        for fut in as_completed(futs):
-            made_api_call, migrations_to_record, migrator_exit_code = fut.result()
-            if made_api_call:
-                num_pushed_or_apied += 1
-            finished_feedstocks.append(futs[fut])
-            num_done += 1
-            if migrator_exit_code:
-                exit_code = 1
+        while (item := scheduler.next_result()) is not None:
+            _handle_result(item)
 
-            for _m, _branch in migrations_to_record:
-                _m.record(futs[fut], _branch)
+    _flush_migrators(MIGRATORS, final=True)
 
     _report_progress(
-        num_done_prev, num_done, feedstocks, num_pushed_or_apied, start_time
+        num_done_prev + num_skipped,
+        num_done,
+        checkpoint,
+        num_pushed_or_apied,
+        start_time,
     )
     print(" ", flush=True)
 
-    finished_feedstocks = sorted(finished_feedstocks)
-    feedstocks["current_feedstock"] = finished_feedstocks[-1]
+    costs.save()
+
+    # swap in the refreshed list of feedstocks
+    if listing is not None:
+        try:
+            timeout = max(start_time + MAX_SECONDS - time.time(), 0)
+            checkpoint.set_feedstocks(listing.result(timeout=timeout)["active"])
+        except TimeoutError:
+            print(
+                "the feedstock listing did not finish in time - "
+                "keeping the cached list",
+                flush=True,
+            )
+        except Exception as e:
+            print("ERROR: could not list the feedstocks", flush=True)
+            _print_error(e)
+        # the data files are read and committed from here on
+        _stop_listing()
 
-    if feedstocks["current_feedstock"] == all_feedstocks[-1]:
+    if checkpoint.all_done:
         print("=" * 80, flush=True)
         print("=" * 80, flush=True)
         print("=" * 80, flush=True)
         print("processed all feedstocks - starting over!", flush=True)
-        feedstocks["current_feedstock"] = ""
-
-    del feedstocks["feedstocks"]
-    with open("data/feedstocks.json", "w") as fp:
-        json.dump(feedstocks, fp, indent=2, sort_keys=True)
+        checkpoint.reset()
+    checkpoint.save()
 
     for m in MIGRATORS:
         m._load_done_table()
     _render_readme()
 
+    if MIRROR_DIR is not None:
+        evict_mirrors()
+    prune_http_cache()
+    prune_user_cache()
+
     if DEBUG:
+        compact_journal()
         # In debug mode, we want to report errors
         return exit_code
     else:
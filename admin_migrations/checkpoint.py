@@ -0,0 +1,113 @@
+import base64
+import json
+import os
+import zlib
+
+CHECKPOINT_FNAME = "data/feedstocks.json"
+
+
+def _encode_bitmap(bits):
+    return base64.b64encode(zlib.compress(bytes(bits))).decode("ascii")
+
+
+def _decode_bitmap(data, size):
+    bits = bytearray(zlib.decompress(base64.b64decode(data)))
+    # pad in case the bitmap was written for a shorter list
+    bits.extend(b"\x00" * ((size + 7) // 8 - len(bits)))
+    return bits
+
+
+class CompletionCheckpoint:
+    """The set of feedstocks finished in the current lap over all feedstocks.
+
+    The set is stored as a bitmap over the sorted feedstock list it was made
+    for, so that feedstocks can finish in any order without skipping or
+    redoing any of them across runs. When the list of feedstocks changes, the
+    bits are carried over by name.
+
+    Parameters
+    ----------
+    feedstocks : list of str
+        The current list of feedstocks.
+    fname : str, optional
+        The file the checkpoint is stored in. If None, the checkpoint is never
+        written to disk.
+    """
+
+    def __init__(self, feedstocks, fname=CHECKPOINT_FNAME):
+        self.fname = fname
+        self._set_empty(feedstocks)
+
+        if fname is not None and os.path.exists(fname):
+            with open(fname) as fp:
+                blob = json.load(fp)
+        else:
+            blob = {}
+
+        if "done" in blob:
+            old_feedstocks = blob["feedstocks"]
+            old_bits = _decode_bitmap(blob["done"], len(old_feedstocks))
+            for i, f in enumerate(old_feedstocks):
+                if old_bits[i // 8] & (1 << (i % 8)) and f in self._index:
+                    self.mark_done(f)
+        elif "current_feedstock" in blob:
+            # older checkpoints only stored the last feedstock of the lap
+            for f in self.feedstocks:
+                if f > blob["current_feedstock"]:
+                    break
+                self.mark_done(f)
+
+    def _set_empty(self, feedstocks):
+        self.feedstocks = sorted(feedstocks)
+        self._index = {f: i for i, f in enumerate(self.feedstocks)}
+        self._bits = bytearray((len(self.feedstocks) + 7) // 8)
+        self._num_done = 0
+
+    def set_feedstocks(self, feedstocks):
+        """Change the list of feedstocks, keeping the finished ones."""
+        done = [f for f in self.feedstocks if self.is_done(f)]
+        self._set_empty(feedstocks)
+        for f in done:
+            self.mark_done(f)
+
+    def __contains__(self, feedstock):
+        return feedstock in self._index
+
+    @property
+    def num_done(self):
+        return self._num_done
+
+    @property
+    def all_done(self):
+        return self._num_done == len(self.feedstocks)
+
+    def is_done(self, feedstock):
+        i = self._index[feedstock]
+        return bool(self._bits[i // 8] & (1 << (i % 8)))
+
+    def mark_done(self, feedstock):
+        if feedstock not in self._index or self.is_done(feedstock):
+            return
+        i = self._index[feedstock]
+        self._bits[i // 8] |= 1 << (i % 8)
+        self._num_done += 1
+
+    def reset(self):
+        """Start a new lap over the feedstocks."""
+        self._bits = bytearray(len(self._bits))
+        self._num_done = 0
+
+    def save(self):
+        if self.fname is None:
+            return
+
+        blob = {
+            "feedstocks": self.feedstocks,
+            "done": _encode_bitmap(self._bits),
+            "num_done": self._num_done,
+        }
+        # write to a temporary file first so a crash mid-write does not lose
+        # the checkpoint
+        with open(self.fname + ".tmp", "w") as fp:
+            json.dump(blob, fp, indent=2, sort_keys=True)
+        os.replace(self.fname + ".tmp", self.fname)
@@ -0,0 +1,95 @@
+import functools
+import os
+import subprocess
+
+from admin_migrations.git_blobs import BlobReader
+from admin_migrations.git_commands import run_git
+
+
+class FeedstockContext:
+    """A feedstock being migrated and its checkout.
+
+    Migrators reach the checkout through the context instead of the current
+    working directory, so that several feedstocks can be migrated at once on
+    the threads of one process.
+
+    Parameters
+    ----------
+    feedstock : str
+        The name of the feedstock without "-feedstock".
+    path : str, optional
+        The checkout of the feedstock. None for migrators that do not need a
+        checkout.
+    """
+
+    def __init__(self, feedstock, path=None):
+        self.feedstock = feedstock
+        self.path = path
+        # reads the files on any branch without checking it out
+        self.blobs = BlobReader(cwd=path) if path is not None else None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        if self.blobs is not None:
+            self.blobs.close()
+
+    @functools.cached_property
+    def _refs(self):
+        # one snapshot of the branches per clone, taken before any branch is
+        # switched to so that HEAD is still the default branch
+        _, out = self.git(
+            [
+                "for-each-ref",
+                "--format=%(HEAD)%09%(refname)",
+                "refs/heads",
+                "refs/remotes/origin",
+            ]
+        )
+        head = None
+        remote = []
+        for line in out.splitlines():
+            current, ref = line.split("\t", 1)
+            if current == "*":
+                head = ref[len("refs/heads/") :]
+            elif ref.startswith("refs/remotes/origin/"):
+                branch = ref[len("refs/remotes/origin/") :]
+                if branch != "HEAD":
+                    remote.append(branch)
+        return head, remote
+
+    @property
+    def default_branch(self):
+        """The branch checked out by the clone."""
+        return self._refs[0]
+
+    @property
+    def branches(self):
+        """The branches on the remote with the default branch first."""
+        head, remote = self._refs
+        return [head] + sorted(br for br in remote if br != head)
+
+    def join(self, *parts):
+        """Return the path of a file in the checkout."""
+        return os.path.join(self.path, *parts)
+
+    def exists(self, pth):
+        return os.path.exists(self.join(pth))
+
+    def open(self, pth, *args, **kwargs):
+        return open(self.join(pth), *args, **kwargs)
+
+    def run(self, args, **kwargs):
+        """Run a command in the checkout with subprocess.run."""
+        return subprocess.run(args, cwd=self.path, **kwargs)
+
+    def git(self, args, check=True):
+        """Run git in the checkout.
+
+        Returns whether the command worked and its output.
+        """
+        return run_git(args, cwd=self.path, check=check)
@@ -0,0 +1,83 @@
+import json
+import os
+
+COSTS_FNAME = "data/feedstock_costs.json"
+
+# the stages timed for each lane
+CHECKOUT_STAGES = ("clone", "migrate", "push")
+API_STAGES = ("api",)
+
+# weight of the newest observation in the running estimate
+ALPHA = 0.5
+
+# the guess in seconds for a stage we have never timed
+DEFAULT_STAGE_COST = 10.0
+
+# estimates are only written back once they move by more than this fraction
+# and at least MIN_SAVED_CHANGE seconds, so the file (which is committed with
+# the data) does not change every run
+SAVED_CHANGE_FRACTION = 0.25
+MIN_SAVED_CHANGE = 1.0
+
+
+class FeedstockCosts:
+    """Observed per-feedstock durations of each stage, kept across runs.
+
+    Each stage's duration is an exponential moving average in seconds.
+    Feedstocks we have never timed are assumed to cost the mean of the ones
+    we have.
+    """
+
+    def __init__(self, fname=COSTS_FNAME):
+        self.fname = fname
+        if os.path.exists(fname):
+            with open(fname) as fp:
+                self._costs = json.load(fp)
+        else:
+            self._costs = {}
+        self._saved = {f: dict(stages) for f, stages in self._costs.items()}
+        self._compute_means()
+
+    def _compute_means(self):
+        totals = {}
+        counts = {}
+        for stages in self._costs.values():
+            for stage, cost in stages.items():
+                totals[stage] = totals.get(stage, 0.0) + cost
+                counts[stage] = counts.get(stage, 0) + 1
+        self._means = {stage: totals[stage] / counts[stage] for stage in totals}
+
+    def update(self, feedstock, timings):
+        stages = self._costs.setdefault(feedstock, {})
+        for stage, duration in timings.items():
+            if stage in stages:
+                duration = ALPHA * duration + (1 - ALPHA) * stages[stage]
+            stages[stage] = round(duration, 1)
+
+    def expected(self, feedstock, stages):
+        """Return the expected duration of the given stages for a feedstock."""
+        known = self._costs.get(feedstock, {})
+        return sum(
+            known.get(stage, self._means.get(stage, DEFAULT_STAGE_COST))
+            for stage in stages
+        )
+
+    def _moved(self, old, new):
+        return abs(new - old) > max(MIN_SAVED_CHANGE, SAVED_CHANGE_FRACTION * old)
+
+    def save(self):
+        """Write the estimates that moved materially since they were loaded.
+
+        The file is left alone if none did.
+        """
+        changed = False
+        for f, stages in self._costs.items():
+            saved = self._saved.setdefault(f, {})
+            for stage, cost in stages.items():
+                if stage not in saved or self._moved(saved[stage], cost):
+                    saved[stage] = cost
+                    changed = True
+
+        if changed:
+            with open(self.fname, "w") as fp:
+                json.dump(self._saved, fp, indent=2, sort_keys=True)
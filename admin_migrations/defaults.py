@@ -24,4 +24,30 @@ if DEBUG:
 else:
     MAX_MIGRATE = 2000
     MAX_SECONDS = _compute_max_migrate_minutes() * 60
-    MAX_WORKERS = 2
+    MAX_WORKERS = max(os.cpu_count() or 1, 2)
+
+# set ADMIN_MIGRATIONS_MIRROR_DIR on a persistent runner to keep bare mirrors of
+# the feedstocks between runs, evicting the least recently used ones once they
+# take up more than ADMIN_MIGRATIONS_MIRROR_MAX_GB
+MIRROR_DIR = os.environ.get("ADMIN_MIGRATIONS_MIRROR_DIR", None)
+MIRROR_MAX_BYTES = int(
+    float(os.environ.get("ADMIN_MIGRATIONS_MIRROR_MAX_GB", "20")) * 1024**3
+)
+
+# directory for caches kept between runs, like the GitHub API responses
+CACHE_DIR = os.environ.get(
+    "ADMIN_MIGRATIONS_CACHE_DIR",
+    os.path.expanduser("~/.cache/admin-migrations"),
+)
+
+# feedstocks each worker process migrates at once on its threads
+THREADS_PER_WORKER = int(os.environ.get("ADMIN_MIGRATIONS_THREADS_PER_WORKER", "4"))
+
+# threads used for migrators that do not need a checkout of the feedstock
+MAX_API_WORKERS = int(os.environ.get("ADMIN_MIGRATIONS_MAX_API_WORKERS", "8"))
+
+# seconds after which the metadata of a feedstock from the last listing of the
+# org is refreshed from the API, the listing itself is updated every run
+REPO_METADATA_TTL = int(
+    os.environ.get("ADMIN_MIGRATIONS_REPO_METADATA_TTL", str(7 * 60 * 60))
+)
@@ -0,0 +1,73 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from admin_migrations.defaults import CACHE_DIR
+
+
+class DiskCache:
+    """A key-value cache on disk shared by all processes of a run.
+
+    Each cache is a sqlite database in CACHE_DIR in WAL mode so that the
+    worker processes can read and write it at the same time. Values must be
+    JSON serializable.
+
+    Parameters
+    ----------
+    name : str
+        The name of the cache, used for the name of its database.
+    cache_dir : str, optional
+        The directory holding the databases.
+    """
+
+    def __init__(self, name, cache_dir=CACHE_DIR):
+        self.path = os.path.join(cache_dir, "%s.sqlite" % name)
+        # connections cannot be shared between threads or forked processes
+        self._local = threading.local()
+
+    def _connection(self):
+        if getattr(self._local, "pid", None) != os.getpid():
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=60, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache "
+                "(key TEXT PRIMARY KEY, value TEXT, updated_at REAL)"
+            )
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return self._local.conn
+
+    def get(self, key, max_age=None):
+        """Get a value from the cache.
+
+        Returns None if the key is missing or older than max_age seconds.
+        """
+        row = (
+            self._connection()
+            .execute("SELECT value, updated_at FROM cache WHERE key = ?", (key,))
+            .fetchone()
+        )
+        if row is None:
+            return None
+        if max_age is not None and time.time() - row[1] > max_age:
+            return None
+        return json.loads(row[0])
+
+    def set(self, key, value):
+        self._connection().execute(
+            "INSERT OR REPLACE INTO cache (key, value, updated_at) VALUES (?, ?, ?)",
+            (key, json.dumps(value), time.time()),
+        )
+
+    def delete(self, key):
+        self._connection().execute("DELETE FROM cache WHERE key = ?", (key,))
+
+    def prune(self, max_age):
+        """Remove all entries older than max_age seconds."""
+        self._connection().execute(
+            "DELETE FROM cache WHERE updated_at < ?", (time.time() - max_age,)
+        )
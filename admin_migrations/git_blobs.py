@@ -0,0 +1,64 @@
+import subprocess
+
+
+class BlobReader:
+    """Read files on any branch of a clone without checking the branch out.
+
+    The files are streamed from the object store through one long-lived
+    `git cat-file --batch` process, which is started on the first read.
+    Files are read as they are on the remote branch, so changes made in the
+    working tree are not seen.
+
+    Parameters
+    ----------
+    cwd : str, optional
+        The clone to read from. Defaults to the current working directory.
+    """
+
+    def __init__(self, cwd=None):
+        self.cwd = cwd
+        self._proc = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        if self._proc is not None:
+            self._proc.stdin.close()
+            self._proc.wait()
+            self._proc = None
+
+    def read(self, branch, path):
+        """Return the contents of a file on a branch as bytes or None if the
+        file does not exist there."""
+        if self._proc is None:
+            self._proc = subprocess.Popen(
+                ["git", "cat-file", "--batch"],
+                cwd=self.cwd,
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+            )
+
+        self._proc.stdin.write(
+            ("refs/remotes/origin/%s:%s\n" % (branch, path)).encode("utf-8")
+        )
+        self._proc.stdin.flush()
+
+        header = self._proc.stdout.readline().decode("utf-8").split()
+        if len(header) != 3:
+            # the object is missing or the name is ambiguous
+            return None
+
+        _, kind, size = header
+        data = self._proc.stdout.read(int(size))
+        # each object is followed by a newline
+        self._proc.stdout.read(1)
+        if kind != "blob":
+            return None
+        return data
+
+    def exists(self, branch, path):
+        return self.read(branch, path) is not None
@@ -0,0 +1,20 @@
+import subprocess
+
+
+def run_git(args, cwd=None, check=True):
+    """Run git with its stderr merged into its output.
+
+    Returns whether the command worked and its output. With check=False a
+    failed command is printed instead of raising.
+    """
+    s = subprocess.run(
+        ["git"] + args,
+        cwd=cwd,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+    )
+    if s.returncode != 0 and not check:
+        print(f"    ERROR: {s.stdout.decode('utf-8')}", flush=True)
+    if check:
+        s.check_returncode()
+    return s.returncode == 0, s.stdout.decode("utf-8")
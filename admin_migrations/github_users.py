@@ -0,0 +1,134 @@
+import os
+import time
+
+from admin_migrations.disk_cache import DiskCache
+from admin_migrations.http_cache import get_github_session
+
+GRAPHQL_URL = "https://api.github.com/graphql"
+
+# logins are reused rarely, so we keep what we resolved for a while and
+# missing logins for less time in case someone takes them
+USER_CACHE_TTL = 7 * 24 * 60 * 60
+USER_NEGATIVE_CACHE_TTL = 24 * 60 * 60
+
+_USER_CACHE = DiskCache("github_users")
+
+# the most logins we resolve in one query, GitHub limits the nodes per query
+MAX_LOGINS_PER_QUERY = 100
+
+TEAM_MEMBERS_QUERY = """
+query($org: String!, $team: String!, $cursor: String) {
+  organization(login: $org) {
+    team(slug: $team) {
+      members(first: 100, after: $cursor) {
+        nodes { login databaseId }
+        pageInfo { hasNextPage endCursor }
+      }
+    }
+  }
+}
+"""
+
+
+def _graphql(query, variables):
+    r = get_github_session().post(
+        GRAPHQL_URL,
+        json={"query": query, "variables": variables},
+        headers={"Authorization": "bearer %s" % os.environ["GITHUB_TOKEN"]},
+    )
+    r.raise_for_status()
+    resp = r.json()
+    if resp.get("data") is None:
+        raise RuntimeError("GraphQL query failed: %s" % resp.get("errors"))
+    return resp["data"]
+
+
+def _cache_user(login, user_id):
+    _USER_CACHE.set("login:%s" % login, {"id": user_id, "cached_at": time.time()})
+
+
+def _get_cached(key, field):
+    # returns a (hit, value) tuple since None is a valid cached value
+    entry = _USER_CACHE.get(key, max_age=USER_CACHE_TTL)
+    if entry is None:
+        return False, None
+    if (
+        entry[field] is None
+        and time.time() - entry["cached_at"] > USER_NEGATIVE_CACHE_TTL
+    ):
+        return False, None
+    return True, entry[field]
+
+
+def prune_user_cache():
+    _USER_CACHE.prune(USER_CACHE_TTL)
+
+
+def get_team_members(org, team_slug):
+    """Get the members of a team.
+
+    Returns
+    -------
+    members : dict or None
+        A dict mapping the lowercase login of each member to their user ID or
+        None if the team does not exist.
+    """
+    members = {}
+    cursor = None
+    while True:
+        data = _graphql(
+            TEAM_MEMBERS_QUERY, {"org": org, "team": team_slug, "cursor": cursor}
+        )
+        team = (data["organization"] or {}).get("team")
+        if team is None:
+            return None
+
+        for node in team["members"]["nodes"]:
+            members[node["login"].lower()] = node["databaseId"]
+            _cache_user(node["login"].lower(), node["databaseId"])
+
+        if not team["members"]["pageInfo"]["hasNextPage"]:
+            return members
+        cursor = team["members"]["pageInfo"]["endCursor"]
+
+
+def get_user_ids(logins):
+    """Resolve logins to user IDs with as few queries as possible.
+
+    Organizations count as users here, like they do in the REST API. Logins
+    resolved recently by any process come from an on-disk cache.
+
+    Returns
+    -------
+    ids : dict
+        A dict mapping each lowercase login to its ID or None if there is no
+        user or organization with that login.
+    """
+    ids = {}
+    misses = []
+    for login in sorted({login.lower() for login in logins}):
+        hit, user_id = _get_cached("login:%s" % login, "id")
+        if hit:
+            ids[login] = user_id
+        else:
+            misses.append(login)
+
+    logins = misses
+    for start in range(0, len(logins), MAX_LOGINS_PER_QUERY):
+        batch = logins[start : start + MAX_LOGINS_PER_QUERY]
+        query = "query(%s) {\n%s\n}" % (
+            ", ".join("$l%d: String!" % i for i in range(len(batch))),
+            "\n".join(
+                "  u%d: repositoryOwner(login: $l%d) { "
+                "... on User { databaseId } "
+                "... on Organization { databaseId } }" % (i, i)
+                for i in range(len(batch))
+            ),
+        )
+        data = _graphql(query, {"l%d" % i: login for i, login in enumerate(batch)})
+        for i, login in enumerate(batch):
+            owner = data["u%d" % i]
+            ids[login] = owner["databaseId"] if owner is not None else None
+            _cache_user(login, ids[login])
+
+    return ids
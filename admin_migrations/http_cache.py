@@ -0,0 +1,165 @@
+import base64
+import hashlib
+
+import github
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+from admin_migrations.disk_cache import DiskCache
+from admin_migrations.rate_limit import get_rate_limiter
+
+# entries not revalidated for this many seconds are dropped
+HTTP_CACHE_MAX_AGE = 30 * 24 * 60 * 60
+
+# these describe the body as sent over the wire, but we store it decoded
+_DROPPED_HEADERS = ("content-encoding", "content-length", "transfer-encoding")
+
+_HTTP_CACHE = DiskCache("http")
+
+
+def _auth_scope(request):
+    # the app installation token changes every run, so keying on it would
+    # never hit across runs. all of the tokens of a kind act as the same
+    # identity for the public conda-forge data we read, so we key on the kind
+    # of token instead, e.g. "ghs" for installation tokens
+    auth = request.headers.get("Authorization", "")
+    if not auth:
+        return "anonymous"
+    token = auth.split(" ", 1)[-1]
+    if "_" in token:
+        return token.split("_", 1)[0]
+    return "token"
+
+
+def _cache_key(request):
+    # responses differ by identity and media type
+    h = hashlib.sha256()
+    for part in (
+        request.method,
+        request.url,
+        _auth_scope(request),
+        request.headers.get("Accept", ""),
+    ):
+        h.update(part.encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+def _response_from_cache(request, entry, not_modified):
+    resp = requests.models.Response()
+    resp.status_code = entry["status"]
+    resp.reason = entry["reason"]
+    resp.headers = CaseInsensitiveDict(entry["headers"])
+    # the 304 has the current rate limit and validators
+    for k, v in not_modified.headers.items():
+        if k.lower() not in _DROPPED_HEADERS:
+            resp.headers[k] = v
+    resp._content = base64.b64decode(entry["body"])
+    resp._content_consumed = True
+    resp.encoding = get_encoding_from_headers(resp.headers)
+    resp.url = request.url
+    resp.request = request
+    resp.raw = not_modified.raw
+    resp.elapsed = not_modified.elapsed
+    resp.connection = not_modified.connection
+    return resp
+
+
+class CachingHTTPAdapter(HTTPAdapter):
+    """An HTTP adapter that revalidates GET requests with ETag and
+    Last-Modified.
+
+    GitHub does not count 304 Not Modified responses against the rate limit,
+    so repeated requests for unchanged data are free. The cached responses
+    are shared by all processes through a `DiskCache`.
+
+    All requests, cached or not, wait for the rate limit governor of the
+    process if there is one.
+    """
+
+    def __init__(self, *args, cache=None, **kwargs):
+        self.cache = cache if cache is not None else _HTTP_CACHE
+        super().__init__(*args, **kwargs)
+
+    def _send(self, request, **kwargs):
+        rate_limiter = get_rate_limiter()
+        if rate_limiter is not None:
+            rate_limiter.wait(request.url)
+        resp = super().send(request, **kwargs)
+        if rate_limiter is not None:
+            rate_limiter.update(request.url, resp)
+        return resp
+
+    def send(self, request, stream=False, **kwargs):
+        if request.method != "GET" or stream:
+            return self._send(request, stream=stream, **kwargs)
+
+        key = _cache_key(request)
+        entry = self.cache.get(key)
+        if entry is not None:
+            if entry["etag"] is not None:
+                request.headers["If-None-Match"] = entry["etag"]
+            if entry["last_modified"] is not None:
+                request.headers["If-Modified-Since"] = entry["last_modified"]
+
+        resp = self._send(request, stream=stream, **kwargs)
+
+        if resp.status_code == 304 and entry is not None:
+            resp = _response_from_cache(request, entry, resp)
+            # keep the entry from being pruned
+            self.cache.set(key, entry)
+        elif resp.status_code == 200 and (
+            "ETag" in resp.headers or "Last-Modified" in resp.headers
+        ):
+            self.cache.set(
+                key,
+                {
+                    "status": resp.status_code,
+                    "reason": resp.reason,
+                    "headers": {
+                        k: v
+                        for k, v in resp.headers.items()
+                        if k.lower() not in _DROPPED_HEADERS
+                    },
+                    "etag": resp.headers.get("ETag"),
+                    "last_modified": resp.headers.get("Last-Modified"),
+                    "body": base64.b64encode(resp.content).decode("ascii"),
+                },
+            )
+
+        return resp
+
+
+class _CachingHTTPSConnectionClass(github.Requester.HTTPSRequestsConnectionClass):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.adapter = CachingHTTPAdapter(
+            max_retries=self.retry,
+            pool_connections=self.pool_size,
+            pool_maxsize=self.pool_size,
+        )
+        self.session.mount("https://", self.adapter)
+
+
+def install_http_cache():
+    """Route all PyGithub requests made in this process through the cache."""
+    github.Requester.Requester.injectConnectionClasses(
+        github.Requester.HTTPRequestsConnectionClass,
+        _CachingHTTPSConnectionClass,
+    )
+    # injecting connection classes also turns off reusing connections, which
+    # we want to keep
+    github.Requester.Requester._Requester__persist = True
+
+
+def get_github_session():
+    """Get a requests session whose GitHub API requests go through the cache."""
+    sess = requests.Session()
+    sess.mount("https://api.github.com/", CachingHTTPAdapter())
+    return sess
+
+
+def prune_http_cache():
+    _HTTP_CACHE.prune(HTTP_CACHE_MAX_AGE)
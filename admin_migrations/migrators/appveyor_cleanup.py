@@ -1,13 +1,10 @@
 import os
-import subprocess
 
 import requests
 from ruamel.yaml import YAML
 
 from .base import Migrator
 
-YAML = YAML()
-
 
 def _get_num_builds(appveyor_name):
     headers = {"Authorization": "Bearer " + os.environ["APPVEYOR_TOKEN"]}
@@ -32,31 +29,17 @@ CFGS = [
 ]
 
 
-def _has_appveyor_any_branch(curr_branch):
-    o = subprocess.run(
-        ["git", "branch", "-r"],
-        check=True,
-        stdout=subprocess.PIPE,
-        stderr=subprocess.STDOUT,
-    )
-
-    branches = []
-    for line in o.stdout.decode("utf-8").split("\n"):
-        if len(line) > 0 and "origin/HEAD" not in line:
-            branches.append(line.strip()[len("origin/") :])
-
+def _has_appveyor_any_branch(ctx):
+    yaml = YAML()
     _has_app = []
-    for branch in branches:
-        subprocess.run(["git", "checkout", branch], check=True)
-        with open("conda-forge.yml") as fp:
-            cf_cfg = YAML.load(fp)
+    for branch in ctx.branches:
+        cf_cfg = yaml.load(ctx.blobs.read(branch, "conda-forge.yml").decode("utf-8"))
 
         if cf_cfg.get("provider", {}).get("win", None) == "azure":
             _has_app.append(False)
         else:
-            _has_app.append(any(os.path.exists(cfg) for cfg in CFGS))
+            _has_app.append(any(ctx.blobs.exists(branch, cfg) for cfg in CFGS))
 
-    subprocess.run(["git", "checkout", curr_branch], check=True)
     return any(_has_app)
 
 
@@ -65,8 +48,11 @@ class AppveyorDelete(Migrator):
     # once per feedstock on the main branch
     main_branch_only = False
     max_workers = 1
+    # the branches are read from the object store
+    checkout_paths = []
+    needs_cwd = False
 
-    def migrate(self, feedstock, branch):
+    def migrate(self, feedstock, branch, ctx):
         headers = {"Authorization": "Bearer " + os.environ["APPVEYOR_TOKEN"]}
 
         assert branch == "main" or branch == "master"
@@ -87,7 +73,7 @@ class AppveyorDelete(Migrator):
             # project does not exist
             deleted = True
         elif r.status_code == 200:
-            has_appveyor = _has_appveyor_any_branch(branch)
+            has_appveyor = _has_appveyor_any_branch(ctx)
             num_builds = _get_num_builds(appveyor_name)
 
             # this logic catches cases where
@@ -140,8 +126,10 @@ class AppveyorDelete(Migrator):
 
 class AppveyorForceDelete(Migrator):
     main_branch_only = True
+    checkout_paths = []
+    needs_checkout = False
 
-    def migrate(self, feedstock, branch):
+    def migrate(self, feedstock, branch, ctx):
         headers = {"Authorization": "Bearer " + os.environ["APPVEYOR_TOKEN"]}
 
         if feedstock == "python":
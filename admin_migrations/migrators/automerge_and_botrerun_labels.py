@@ -25,8 +25,10 @@ def _gh():
 
 class AutomergeAndBotRerunLabels(Migrator):
     main_branch_only = True
+    checkout_paths = []
+    needs_checkout = False
 
-    def migrate(self, feedstock, branch):
+    def migrate(self, feedstock, branch, ctx):
         try:
             repo = _gh().get_repo("conda-forge/%s-feedstock" % feedstock)
             if repo.archived:
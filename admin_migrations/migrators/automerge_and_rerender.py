@@ -41,7 +41,9 @@ jobs:
 
 
 class AutomergeAndRerender(Migrator):
-    def migrate(self, feedstock, branch):
+    checkout_paths = [".github/workflows/"]
+
+    def migrate(self, feedstock, branch, ctx):
         if os.path.exists(".github/workflows/main.yml") and os.path.exists(
             ".github/workflows/webservices.yml"
         ):
@@ -1,5 +1,56 @@
 import json
 import os
+import time
+
+# append-only log of recorded migrations, folded into data/<migrator>.json
+# by compact_journal at the end of a run
+JOURNAL_FNAME = "data/journal.jsonl"
+
+
+def _load_json(fname):
+    if not os.path.exists(fname):
+        return {}
+    with open(fname) as fp:
+        return json.load(fp)
+
+
+def _read_journal():
+    if not os.path.exists(JOURNAL_FNAME):
+        return []
+
+    entries = []
+    with open(JOURNAL_FNAME) as fp:
+        for line in fp:
+            try:
+                entries.append(json.loads(line))
+            except json.JSONDecodeError:
+                # a run that was killed mid-write can leave a partial line
+                pass
+    return entries
+
+
+def compact_journal():
+    """Fold the journal into the data/<migrator>.json files and remove it.
+
+    The data files are replaced atomically and the journal is only removed
+    after all of them are written, so replaying it again is always safe.
+    """
+    updates = {}
+    for entry in _read_journal():
+        updates.setdefault(entry["migrator"], []).append(entry)
+
+    for name, entries in updates.items():
+        fname = "data/%s.json" % name
+        blob = _load_json(fname)
+        for entry in entries:
+            blob.setdefault(entry["feedstock"], {})[entry["branch"]] = True
+
+        with open(fname + ".tmp", "w") as fp:
+            json.dump(blob, fp, indent=2, sort_keys=True)
+        os.replace(fname + ".tmp", fname)
+
+    if os.path.exists(JOURNAL_FNAME):
+        os.remove(JOURNAL_FNAME)
 
 
 class Migrator:
@@ -8,17 +59,33 @@ class Migrator:
     main_branch_only = False
     max_processes = 100000
     continual = False
+    # set this to the list of paths (relative to the feedstock root, with
+    # directories ending in "/") that the migrator reads or writes
+    # if every migrator for a feedstock lists its paths, the feedstock is cloned
+    # without file contents and only those paths plus the recipe are checked out
+    # None means the migrator needs the full working tree
+    checkout_paths = None
+    # set this to false if the migrator only makes API calls and never reads or
+    # writes the feedstock contents. these migrators run on the default branch,
+    # on the clone made for the other migrators if the feedstock is cloned and
+    # on threads in the main process without cloning it otherwise
+    needs_checkout = True
+    # set this to false once the migrator only reaches the feedstock through
+    # the FeedstockContext passed to it. migrators that need the feedstock as
+    # the current working directory run one at a time in each process
+    needs_cwd = True
 
     def __init__(self):
         self._load_done_table()
 
     def _load_done_table(self):
-        fname = "data/%s.json" % self.__class__.__name__
-        if not os.path.exists(fname):
-            blob = {}
-        else:
-            with open(fname) as fp:
-                blob = json.load(fp)
+        blob = _load_json("data/%s.json" % self.__class__.__name__)
+
+        # replay anything recorded since the last compaction
+        for entry in _read_journal():
+            if entry["migrator"] == self.__class__.__name__:
+                blob.setdefault(entry["feedstock"], {})[entry["branch"]] = True
+
         self._done_table = blob
 
         print(
@@ -43,11 +110,33 @@ class Migrator:
                 "master", False
             ) or self._done_table.get(feedstock, {}).get("main", False)
 
-    def migrate(self, feedstock, branch):
+    def check(self, feedstock, branch, ctx):
+        """Return the result of the migration if it can be decided from the
+        committed files alone, None otherwise.
+
+        This is called before the branch is checked out, so that branches
+        that no migrator will change are never checked out. The result has
+        the same form as the return value of `migrate`, but no commit is made.
+
+        Parameters
+        ----------
+        feedstock : str
+            The name of the feedstock without "-feedstock".
+        branch : str
+            Which branch of the feedstock the migrator is being called on.
+        ctx : admin_migrations.context.FeedstockContext
+            The feedstock. The files on the branch are read with
+            `ctx.blobs.read(branch, path)`.
+        """
+        return None
+
+    def migrate(self, feedstock, branch, ctx):
         """Migrate the feedstock.
 
-        This function is invoked with the feedstock as the current
-        working directory.
+        The checkout of the feedstock is at `ctx.path`. Implementations should
+        use the helpers on `ctx` to read and write files and to run git, and
+        set `needs_cwd = False`. Otherwise the migrator is invoked with the
+        feedstock as the current working directory.
 
         Implementations should make any desired changes and then "git add"
         the resulting files.
@@ -66,6 +155,11 @@ class Migrator:
         as done but tells the code not to make any commits (since the file is already)
         there.
 
+        Return None for the migration working if the work was queued for
+        `flush`. The feedstock is then not marked as migrated and it is not
+        an error. Either `flush` records the feedstock with `record` once the
+        queued work is done, or the migrator is called again in a later run.
+
         Parameters
         ----------
         feedstock : str
@@ -73,23 +167,37 @@ class Migrator:
             and not "python-feedstock").
         branch : str
             Which branch of the feedstock the migrator is being called on.
+        ctx : admin_migrations.context.FeedstockContext
+            The feedstock and its checkout. Migrators that do not need a
+            checkout get a context without one.
         """
         raise NotImplementedError()
 
+    def flush(self, final=False):
+        """Apply any work the migrator batched up across feedstocks.
+
+        This method is called in the main process from the root of the repo,
+        every so often while the feedstocks are migrated and once more with
+        `final=True` after all of them are done.
+
+        Parameters
+        ----------
+        final : bool
+            True if this is the last call of the run.
+        """
+        pass
+
     def message(self):
         return "admin migration %s" % self.__class__.__name__
 
     def record(self, feedstock, branch):
-        fname = "data/%s.json" % self.__class__.__name__
-        if not os.path.exists(fname):
-            blob = {}
-        else:
-            with open(fname) as fp:
-                blob = json.load(fp)
-
-        if feedstock not in blob:
-            blob[feedstock] = {}
-        blob[feedstock][branch] = True
-
-        with open(fname, "w") as fp:
-            json.dump(blob, fp, indent=2, sort_keys=True)
+        entry = {
+            "migrator": self.__class__.__name__,
+            "feedstock": feedstock,
+            "branch": branch,
+            "timestamp": time.time(),
+        }
+        with open(JOURNAL_FNAME, "a") as fp:
+            fp.write(json.dumps(entry) + "\n")
+
+        self._done_table.setdefault(feedstock, {})[branch] = True
@@ -54,9 +54,10 @@ def _add_branch_protection_ruleset(gh_repo):
 
 class BranchProtection(Migrator):
     main_branch_only = True
-    max_processes = 1
+    checkout_paths = []
+    needs_checkout = False
 
-    def migrate(self, feedstock, branch):
+    def migrate(self, feedstock, branch, ctx):
         repo_name = "%s-feedstock" % feedstock
 
         gh_repo = get_org().get_repo(repo_name)
@@ -176,8 +176,9 @@ def _cleanup_cfgy(code, top, token_name):
 class CFEP13TokenCleanup(Migrator):
     max_workers = 1
     max_migrate = 200
+    checkout_paths = ["conda-forge.yml"]
 
-    def migrate(self, feedstock, branch):
+    def migrate(self, feedstock, branch, ctx):
         user = "conda-forge"
         project = "%s-feedstock" % feedstock
 
@@ -2,17 +2,24 @@ import glob
 import json
 import os
 import subprocess
+import time
 
 import conda_build
 from conda_smithy.feedstock_tokens import feedstock_token_exists
 from rattler_build_conda_compat.render import render_recipe as render_rattler_build
 from ruamel.yaml import YAML
 
+from admin_migrations.git_commands import run_git
+from admin_migrations.spool import append_to_spool, drain_spool, spool_size
+
 from .base import Migrator
 
 TOKENS_REPO = "https://${GITHUB_TOKEN}@github.com/conda-forge/feedstock-tokens.git"
 OUTPUTS_REPO = "https://${GITHUB_TOKEN}@github.com/conda-forge/feedstock-outputs.git"
 
+# push a commit to the outputs repo once this many outputs are queued
+OUTPUTS_PUSH_EVERY = 50
+
 
 def _read_conda_forge_yaml(yaml):
     if os.path.exists("conda-forge.yml"):
@@ -38,8 +45,9 @@ def _read_conda_forge_yaml(yaml):
 
 class CFEP13TurnOff(Migrator):
     max_migrate = 200
+    checkout_paths = ["conda-forge.yml"]
 
-    def migrate(self, feedstock, branch):
+    def migrate(self, feedstock, branch, ctx):
         yaml = YAML()
         cfg = _read_conda_forge_yaml(yaml)
 
@@ -111,7 +119,61 @@ def _get_sharded_path(output):
     return os.path.join("outputs", chars[0], chars[1], chars[2], output + ".json")
 
 
+def _run_outputs_git(args):
+    return run_git(args, cwd=os.environ["FEEDSTOCK_OUTPUTS_REPO"])[1]
+
+
+class _OutputsIndex:
+    """The set of output shards in the local checkout of the outputs repo.
+
+    The index is built once from the tree at HEAD and then updated from the
+    diff to the new HEAD whenever the checkout moves, so checking an output
+    never needs a pull or a filesystem probe.
+    """
+
+    def __init__(self):
+        self.head = None
+        self.paths = set()
+
+    def refresh(self):
+        head = _run_outputs_git(["rev-parse", "HEAD"]).strip()
+        if self.head is None:
+            self.paths = set(
+                _run_outputs_git(
+                    ["ls-tree", "-r", "--name-only", "HEAD", "--", "outputs"]
+                ).splitlines()
+            )
+        elif head != self.head:
+            for line in _run_outputs_git(
+                [
+                    "diff",
+                    "--name-status",
+                    "--no-renames",
+                    self.head,
+                    head,
+                    "--",
+                    "outputs",
+                ]
+            ).splitlines():
+                status, path = line.split("\t", 1)
+                if status == "D":
+                    self.paths.discard(path)
+                else:
+                    self.paths.add(path)
+        self.head = head
+
+    def __contains__(self, output):
+        return _get_sharded_path(output) in self.paths
+
+
+_OUTPUTS_INDEX = _OutputsIndex()
+
+
 def _register_feedstock_outputs(feedstock):
+    """Queue the outputs of the feedstock that are not registered yet.
+
+    Returns True if all of the outputs are registered already.
+    """
     unames = set()
 
     is_rattler_build = False
@@ -192,55 +254,93 @@ def _register_feedstock_outputs(feedstock):
 
     print("    output names:", unames, flush=True)
 
-    for name in unames:
-        sharded_name = _get_sharded_path(name)
-        outpth = os.path.join(
-            os.environ["FEEDSTOCK_OUTPUTS_REPO"],
-            sharded_name,
+    # the outputs repo is written by the main process in batches, see
+    # _push_feedstock_outputs
+    _OUTPUTS_INDEX.refresh()
+    registered = True
+    for name in sorted(unames):
+        if name in _OUTPUTS_INDEX:
+            print("    output already registered:", name, flush=True)
+            continue
+        append_to_spool(
+            CFEP13TokensAndConfig.__name__, {"feedstock": feedstock, "output": name}
         )
+        print("    queued output:", name, flush=True)
+        registered = False
 
-        subprocess.run(
-            ["git", "pull", "--quiet"],
-            check=True,
-            cwd=os.environ["FEEDSTOCK_OUTPUTS_REPO"],
-        )
+    return registered
+
+
+def _push_feedstock_outputs(entries):
+    """Register the queued outputs with one commit to the outputs repo.
 
-        if not os.path.exists(outpth):
+    Outputs that are already registered are left alone. The push is retried
+    on top of the latest upstream commit if someone else pushed first.
+    """
+    for i in range(5):
+        _run_outputs_git(["pull", "--quiet", "--rebase"])
+        _OUTPUTS_INDEX.refresh()
+
+        added = {}
+        for entry in entries:
+            if entry["output"] in added or entry["output"] in _OUTPUTS_INDEX:
+                continue
+
+            sharded_name = _get_sharded_path(entry["output"])
+            outpth = os.path.join(os.environ["FEEDSTOCK_OUTPUTS_REPO"], sharded_name)
             os.makedirs(os.path.dirname(outpth), exist_ok=True)
             with open(outpth, "w") as fp:
-                json.dump({"feedstocks": [feedstock]}, fp)
+                json.dump({"feedstocks": [entry["feedstock"]]}, fp)
+            _run_outputs_git(["add", sharded_name])
+            added[entry["output"]] = entry["feedstock"]
 
-            subprocess.run(
-                ["git", "add", sharded_name],
-                check=True,
-                cwd=os.environ["FEEDSTOCK_OUTPUTS_REPO"],
-            )
+        if not added:
+            return added
 
-            subprocess.run(
-                [
-                    "git",
-                    "commit",
-                    "-am",
-                    "[ci skip] [skip ci] [cf admin skip] ***NO_CI*** "
-                    "added output %s for conda-forge/%s" % (name, feedstock),
-                ],
-                check=True,
-                cwd=os.environ["FEEDSTOCK_OUTPUTS_REPO"],
+        if len(added) == 1:
+            ((name, feedstock),) = added.items()
+            msg = "added output %s for conda-forge/%s" % (name, feedstock)
+        else:
+            msg = "added %d outputs\n\n%s" % (
+                len(added),
+                "\n".join(
+                    "%s for conda-forge/%s" % (name, feedstock)
+                    for name, feedstock in sorted(added.items())
+                ),
             )
+        _run_outputs_git(
+            [
+                "commit",
+                "--quiet",
+                "-m",
+                "[ci skip] [skip ci] [cf admin skip] ***NO_CI*** " + msg,
+            ]
+        )
 
-            subprocess.run(
-                ["git", "push", "--quiet"],
-                check=True,
-                cwd=os.environ["FEEDSTOCK_OUTPUTS_REPO"],
-            )
-            print("    added output:", name, flush=True)
+        try:
+            _run_outputs_git(["push", "--quiet"])
+            return added
+        except subprocess.CalledProcessError:
+            # someone else pushed in the meantime, drop our commit and redo
+            # it on top of theirs
+            print("    push to the outputs repo failed, retrying", flush=True)
+            _run_outputs_git(["reset", "--quiet", "--hard", "HEAD~1"])
+            time.sleep(2**i)
+
+    raise RuntimeError("could not push the feedstock outputs repo")
 
 
 class CFEP13TokensAndConfig(Migrator):
     max_workers = 1
     max_migrate = 200
+    checkout_paths = ["conda-forge.yml", "recipe/", ".ci_support/"]
 
-    def migrate(self, feedstock, branch):
+    def __init__(self):
+        super().__init__()
+        # the feedstocks whose default branch this process has migrated
+        self._default_branch_done = set()
+
+    def migrate(self, feedstock, branch, ctx):
         yaml = YAML()
         cfg = _read_conda_forge_yaml(yaml)
 
@@ -251,10 +351,20 @@ class CFEP13TokensAndConfig(Migrator):
                 "conda-forge", feedstock + "-feedstock", TOKENS_REPO
             )
         ):
+            if branch == "master" or branch == "main":
+                self._default_branch_done.add(feedstock)
             # migration done, no commits, no API calls
             return True, False, False
 
         if branch == "master" or branch == "main":
+            # output validation is only turned on once the outputs are in
+            # the outputs repo, the queued ones are pushed by flush and the
+            # feedstock is migrated again in a later run. the tokens are
+            # registered on that visit so that they are only set up once.
+            if not _register_feedstock_outputs(feedstock):
+                print("    queued outputs for the outputs repo", flush=True)
+                return None, False, False
+
             # register a feedstock token
             # this call is idempotent if the token already exists
             _register_feedstock_token(feedstock)
@@ -268,10 +378,14 @@ class CFEP13TokensAndConfig(Migrator):
                 check=True,
             )
             print("    added staging binstar token", flush=True)
-
-            # register the outputs
-            _register_feedstock_outputs(feedstock)
-            print("    added output to outputs repo", flush=True)
+            self._default_branch_done.add(feedstock)
+        elif feedstock not in self._default_branch_done and not self.skip(
+            feedstock, "main"
+        ):
+            # the outputs are registered from the default branch, which is
+            # migrated first in the same call or in an earlier run
+            print("    waiting for the default branch", flush=True)
+            return None, False, False
 
         # set the param and write
         cfg["conda_forge_output_validation"] = True
@@ -285,3 +399,18 @@ class CFEP13TokensAndConfig(Migrator):
 
         # migration done, make a commit, lots of API calls
         return True, True, True
+
+    def flush(self, final=False):
+        name = self.__class__.__name__
+        size = spool_size(name)
+        if size >= OUTPUTS_PUSH_EVERY or (final and size > 0):
+            entries = drain_spool(name)
+            try:
+                added = _push_feedstock_outputs(entries)
+            except Exception:
+                # put them back for the next try
+                for entry in entries:
+                    append_to_spool(name, entry)
+                raise
+            for output in sorted(added):
+                print("added output:", output, flush=True)
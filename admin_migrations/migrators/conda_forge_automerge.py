@@ -25,7 +25,9 @@ jobs:
 
 
 class CondaForgeAutomerge(Migrator):
-    def migrate(self, feedstock, branch):
+    checkout_paths = [".github/workflows/"]
+
+    def migrate(self, feedstock, branch, ctx):
         if os.path.exists(".github/workflows/automerge.yml") and not os.path.exists(
             ".github/workflows/main.yml"
         ):
@@ -51,7 +53,9 @@ class CondaForgeAutomerge(Migrator):
 
 
 class CondaForgeAutomergeUpdate(Migrator):
-    def migrate(self, feedstock, branch):
+    checkout_paths = [".github/workflows/"]
+
+    def migrate(self, feedstock, branch, ctx):
         if not os.path.exists(".github/workflows/automerge.yml"):
             return True, False, False
 
@@ -1,5 +1,3 @@
-import subprocess
-
 from ruamel.yaml import YAML
 
 from .base import Migrator
@@ -9,9 +7,18 @@ class CondaForgeYAMLTest(Migrator):
     """Cleanup conda-forge.yml test_on_native_only"""
 
     continual = True
+    checkout_paths = ["conda-forge.yml"]
+    needs_cwd = False
+
+    def check(self, feedstock, branch, ctx):
+        meta_yaml = ctx.blobs.read(branch, "conda-forge.yml")
+        if meta_yaml is None or b"test_on_native_only" not in meta_yaml:
+            # no migration, no commit needs to be made, no api calls
+            return False, False, False
+        return None
 
-    def migrate(self, feedstock, branch):
-        with open("conda-forge.yml") as fp:
+    def migrate(self, feedstock, branch, ctx):
+        with ctx.open("conda-forge.yml") as fp:
             meta_yaml = fp.read()
 
         if meta_yaml.strip() == "[]" or meta_yaml.strip() == "[ ]":
@@ -29,13 +36,10 @@ class CondaForgeYAMLTest(Migrator):
         if str(value) in ["True", "true"] and "test" not in cfg:
             cfg["test"] = "native_and_emulated"
 
-        with open("conda-forge.yml", "w") as fp:
+        with ctx.open("conda-forge.yml", "w") as fp:
             yaml.dump(cfg, fp)
 
-        subprocess.run(
-            ["git", "add", "conda-forge.yml"],
-            check=True,
-        )
+        ctx.git(["add", "conda-forge.yml"])
 
         # did migration, make a commit, no api calls
         # return True, True, False
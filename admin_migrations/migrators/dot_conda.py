@@ -36,7 +36,9 @@ def _read_conda_forge_yaml(yaml):
 
 
 class DotConda(Migrator):
-    def migrate(self, feedstock, branch):
+    checkout_paths = ["conda-forge.yml"]
+
+    def migrate(self, feedstock, branch, ctx):
         repo = _gh().get_repo("conda-forge/%s-feedstock" % feedstock)
         if repo.archived:
             # migration done, make a commit, lots of API calls
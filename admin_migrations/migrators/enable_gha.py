@@ -25,8 +25,9 @@ jobs:
 
 class EnableGHAWorkflows(Migrator):
     main_branch_only = True
+    checkout_paths = [".github/workflows/"]
 
-    def migrate(self, feedstock, branch):
+    def migrate(self, feedstock, branch, ctx):
         workflows_dir = Path(".github/workflows")
         if list(chain(workflows_dir.glob("*.yml"), workflows_dir.glob("*.yaml"))):
             # Already enabled
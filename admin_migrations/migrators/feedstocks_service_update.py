@@ -1,88 +1,189 @@
 import os
 import shutil
+import subprocess
 import tempfile
 import time
 
-import git
 import github
 
+from admin_migrations.git_commands import run_git
+from admin_migrations.repo_metadata import get_repo_metadata
+from admin_migrations.spool import append_to_spool, drain_spool, spool_size
+
 from .base import Migrator
 
+# push a commit to the feedstocks repo once this many feedstocks are queued
+PUSH_EVERY = 100
+
+
+def _get_default_branch(org_name, repo_name):
+    md = get_repo_metadata(repo_name[: -len("-feedstock")])
+    if md is not None:
+        return md["default_branch"]
+
+    # sometimes the webhook outpaces other bits of the API so we try a bit
+    for i in range(5):
+        try:
+            gh = github.Github(os.environ["GITHUB_TOKEN"])
+            return gh.get_repo(f"{org_name}/{repo_name}").default_branch
+        except Exception as e:
+            if i < 4:
+                time.sleep(0.050 * 2**i)
+                continue
+            else:
+                raise e
+
 
 class FeedstocksServiceUpdate(Migrator):
     main_branch_only = True
-    max_processes = 1
+    checkout_paths = []
+    needs_checkout = False
+
+    def __init__(self):
+        super().__init__()
+        self._feedstocks_dir = None
 
-    def migrate(self, feedstock, branch):
+    def migrate(self, feedstock, branch, ctx):
         org_name = "conda-forge"
 
         # code here os from webservices repo
         repo_name = feedstock + "-feedstock"
         name = repo_name[: -len("-feedstock")]
 
-        tmp_dir = None
-        try:
-            tmp_dir = tempfile.mkdtemp("_recipe")
+        default_branch = _get_default_branch(org_name, repo_name)
+        sha = run_git(
+            [
+                "ls-remote",
+                f"https://github.com/{org_name}/{repo_name}.git",
+                "refs/heads/%s" % default_branch,
+            ],
+            None,
+        )[1].split()[0]
+
+        # the submodule is updated in a batch by flush
+        append_to_spool(
+            self.__class__.__name__,
+            {"name": name, "branch": default_branch, "sha": sha},
+        )
+        print("    queued submodule update", flush=True)
+
+        # flush records the feedstock once the submodule update is pushed
+        return None, False, True
 
-            feedstocks_url = (
-                "https://x-access-token:{}@github.com/conda-forge/feedstocks.git"
-                "".format(os.environ["GITHUB_TOKEN"])
+    def _clone_feedstocks(self):
+        self._feedstocks_dir = tempfile.mkdtemp("_feedstocks")
+        feedstocks_url = (
+            "https://x-access-token:{}@github.com/conda-forge/feedstocks.git".format(
+                os.environ["GITHUB_TOKEN"]
             )
-            feedstocks_repo = git.Repo.clone_from(
+        )
+        # only .gitmodules is needed in the working tree, the submodules are
+        # updated in the index
+        run_git(
+            [
+                "clone",
+                "--depth=1",
+                "--no-checkout",
+                "--quiet",
                 feedstocks_url,
-                tmp_dir,
-                depth=1,
-            )
-            print("    cloned feedstocks repo", flush=True)
-
-            # Get the submodule
-            # sometimes the webhook outpaces other bits of the API so we try a bit
-            for i in range(5):
-                try:
-                    gh = github.Github(os.environ["GITHUB_TOKEN"])
-                    default_branch = gh.get_repo(
-                        f"{org_name}/{repo_name}"
-                    ).default_branch
-                    break
-                except Exception as e:
-                    if i < 4:
-                        time.sleep(0.050 * 2**i)
-                        continue
-                    else:
-                        raise e
-
-            feedstock_submodule = feedstocks_repo.create_submodule(
-                name=name,
-                path=os.path.join("feedstocks", name),
-                url=f"https://github.com/{org_name}/{repo_name}.git",
-                branch=default_branch,
-            )
+                self._feedstocks_dir,
+            ],
+            None,
+        )
+        run_git(
+            ["sparse-checkout", "set", "--no-cone", "/.gitmodules"],
+            self._feedstocks_dir,
+        )
+        run_git(["checkout", "--quiet"], self._feedstocks_dir)
+        print("    cloned feedstocks repo", flush=True)
 
-            # Update the feedstocks submodule
-            with feedstock_submodule.config_writer() as cfg:
-                cfg.config.set_value(
-                    'submodule "%s"' % name,
-                    "branch",
-                    "refs/heads/%s" % default_branch,
+    def _update_submodules(self, entries):
+        cwd = self._feedstocks_dir
+        for entry in entries:
+            name = entry["name"]
+            path = os.path.join("feedstocks", name)
+            for key, value in [
+                ("path", path),
+                ("url", f"https://github.com/conda-forge/{name}-feedstock.git"),
+                ("branch", "refs/heads/%s" % entry["branch"]),
+            ]:
+                run_git(
+                    ["config", "-f", ".gitmodules", f"submodule.{name}.{key}", value],
+                    cwd,
                 )
-            feedstock_submodule.update(
-                init=True, recursive=False, force=True, to_latest_revision=True
+            run_git(
+                [
+                    "update-index",
+                    "--add",
+                    "--cacheinfo",
+                    "160000,%s,%s" % (entry["sha"], path),
+                ],
+                cwd,
             )
-            feedstocks_repo.git.add([".gitmodules", feedstock_submodule.path])
-            print("    updated submodule", flush=True)
+        run_git(["add", ".gitmodules"], cwd)
+
+        if (
+            subprocess.run(["git", "diff", "--cached", "--quiet"], cwd=cwd).returncode
+            == 0
+        ):
+            return False
+
+        names = sorted({entry["name"] for entry in entries})
+        if len(names) == 1:
+            msg = f"Updated the {names[0]} feedstock."
+        else:
+            msg = "Updated %d feedstocks.\n\n%s" % (len(names), "\n".join(names))
+        run_git(["commit", "--quiet", "-m", msg], cwd)
+        return True
+
+    def _push(self, entries):
+        for i in range(5):
+            if self._feedstocks_dir is None:
+                self._clone_feedstocks()
+            else:
+                # start from the latest upstream commit each time
+                run_git(
+                    ["fetch", "--quiet", "--depth=1", "origin", "HEAD"],
+                    self._feedstocks_dir,
+                )
+                run_git(
+                    ["reset", "--quiet", "--hard", "FETCH_HEAD"], self._feedstocks_dir
+                )
+
+            if not self._update_submodules(entries):
+                return
 
-            # Submit changes
-            if feedstocks_repo.is_dirty(working_tree=False, untracked_files=True):
-                feedstocks_repo.index.commit(
-                    f"Updated the {name} feedstock.",
+            try:
+                run_git(["push", "--quiet", "origin", "HEAD"], self._feedstocks_dir)
+                return
+            except subprocess.CalledProcessError as e:
+                # someone else pushed in the meantime
+                print(
+                    "    push failed, retrying: %s" % e.stdout.decode("utf-8"),
+                    flush=True,
                 )
-                feedstocks_repo.remote().pull(rebase=True)
-                feedstocks_repo.remote().push()
-            print("    pushed if needed", flush=True)
+                time.sleep(2**i)
 
-        finally:
-            if tmp_dir is not None:
-                shutil.rmtree(tmp_dir)
+        raise RuntimeError("could not push the feedstocks repo")
+
+    def flush(self, final=False):
+        name = self.__class__.__name__
+        if spool_size(name) >= PUSH_EVERY or (final and spool_size(name) > 0):
+            entries = drain_spool(name)
+            try:
+                self._push(entries)
+            except Exception:
+                # put them back for the next try
+                for entry in entries:
+                    append_to_spool(name, entry)
+                raise
+            print(
+                "updated %d submodules in the feedstocks repo" % len(entries),
+                flush=True,
+            )
+            for entry in entries:
+                self.record(entry["name"], entry["branch"])
 
-        # migration done, make a commit, lots of API calls
-        return True, False, True
+        if final and self._feedstocks_dir is not None:
+            shutil.rmtree(self._feedstocks_dir)
+            self._feedstocks_dir = None
@@ -5,9 +5,10 @@ import time
 from functools import lru_cache
 
 import github
-import requests
 from ruamel.yaml import YAML
 
+from admin_migrations.http_cache import get_github_session
+
 from .base import Migrator
 
 CIRCLECI_BLANK = """
@@ -150,7 +151,7 @@ def _get_req_session(github_token):
     #  https://alexwlchan.net/2019/03/
     #    creating-a-github-action-to-auto-merge-pull-requests/
     # with lots of edits
-    sess = requests.Session()
+    sess = get_github_session()
     sess.headers = {
         "Accept": "application/vnd.github.v3+json",
         "Authorization": f"token {github_token}",
@@ -320,7 +321,7 @@ def _master_to_main(repo):
 
 
 class CondaForgeMasterToMain(Migrator):
-    def migrate(self, feedstock, branch):
+    def migrate(self, feedstock, branch, ctx):
         repo = _gh().get_repo("conda-forge/%s-feedstock" % feedstock)
         if repo.archived:
             # migration done, make a commit, lots of API calls
@@ -382,7 +383,9 @@ class CondaForgeMasterToMain(Migrator):
 
 
 class CondaForgeGHAWithMain(Migrator):
-    def migrate(self, feedstock, branch):
+    checkout_paths = [".github/workflows/"]
+
+    def migrate(self, feedstock, branch, ctx):
         with open(".github/workflows/automerge.yml", "w") as fp:
             fp.write(AUTOMERGE_MASTER)
 
@@ -1,4 +1,3 @@
-import subprocess
 from pathlib import Path
 
 from rattler_build_conda_compat.recipe_sources import get_all_url_sources
@@ -10,10 +9,10 @@ MIRROR = "cran_mirror"
 CONTRIB = "cran.r-project.org/src/contrib"
 
 
-def _get_conda_build_recipe_location():
+def _get_conda_build_recipe_location(root):
     """Get the location of the conda build recipe recipe"""
-    first_meta_path = Path("recipe/meta.yaml")
-    second_meta_path = Path("recipe/recipe/meta.yaml")
+    first_meta_path = Path(root) / "recipe/meta.yaml"
+    second_meta_path = Path(root) / "recipe/recipe/meta.yaml"
     if first_meta_path.exists():
         return first_meta_path
     elif second_meta_path.exists():
@@ -21,18 +20,18 @@ def _get_conda_build_recipe_location():
     return None
 
 
-def _get_rattler_build_recipe_location():
+def _get_rattler_build_recipe_location(root):
     """Get the location of the rattler build recipe"""
-    recipe_path = Path("recipe/recipe.yaml")
+    recipe_path = Path(root) / "recipe/recipe.yaml"
     if recipe_path.exists():
         return recipe_path
     return None
 
 
-def _has_r_team():
+def _has_r_team(root):
     yaml = YAML()
 
-    meta_loc = _get_conda_build_recipe_location()
+    meta_loc = _get_conda_build_recipe_location(root)
     if not meta_loc:
         return
 
@@ -50,11 +49,11 @@ def _has_r_team():
     return "conda-forge/r" in maints
 
 
-def _has_r_team_rattler_build():
+def _has_r_team_rattler_build(root):
     """Check if the recipe has a conda-forge/r maintainer.
     Works with rattler-build recipes"""
     yaml = YAML()
-    recipe_location = _get_rattler_build_recipe_location()
+    recipe_location = _get_rattler_build_recipe_location(root)
     if not recipe_location:
         return False
     try:
@@ -69,10 +68,10 @@ def _has_r_team_rattler_build():
         return False
 
 
-def _has_cran_url():
+def _has_cran_url(root):
     stop_tokens = ["build:", "requirements:", "test:", "about:", "extra:"]
 
-    meta_loc = _get_conda_build_recipe_location()
+    meta_loc = _get_conda_build_recipe_location(root)
     if meta_loc is None:
         return
 
@@ -94,7 +93,7 @@ def _has_cran_url():
     return False
 
 
-def _has_cran_url_rattler_build():
+def _has_cran_url_rattler_build(root):
     """Check if the recipe has a cran url in the source section.
     Works with rattler-build recipes
     Collect all urls in the source section and check if any of them are cran urls.
@@ -124,7 +123,7 @@ def _has_cran_url_rattler_build():
     """
 
     yaml = YAML()
-    recipe_location = _get_rattler_build_recipe_location()
+    recipe_location = _get_rattler_build_recipe_location(root)
     if not recipe_location:
         return False
     try:
@@ -151,14 +150,22 @@ class RAutomerge(Migrator):
     """
 
     continual = True
+    checkout_paths = ["conda-forge.yml"]
+    needs_cwd = False
 
-    def migrate(self, feedstock, branch):
+    def check(self, feedstock, branch, ctx):
         if not (feedstock.startswith("r-") and feedstock != "r-base"):
             # no migration, no commit needs to be made, no api calls
             return False, False, False
+        return None
 
-        has_r_team = _has_r_team() or _has_r_team_rattler_build()
-        has_cran_url = _has_cran_url() or _has_cran_url_rattler_build()
+    def migrate(self, feedstock, branch, ctx):
+        if not (feedstock.startswith("r-") and feedstock != "r-base"):
+            # no migration, no commit needs to be made, no api calls
+            return False, False, False
+
+        has_r_team = _has_r_team(ctx.path) or _has_r_team_rattler_build(ctx.path)
+        has_cran_url = _has_cran_url(ctx.path) or _has_cran_url_rattler_build(ctx.path)
 
         if (
             feedstock.startswith("r-")
@@ -169,13 +176,13 @@ class RAutomerge(Migrator):
             print("    r team:", has_r_team, flush=True)
             print("    cran url:", has_cran_url, flush=True)
 
-            with Path("conda-forge.yml").open("r") as fp:
+            with ctx.open("conda-forge.yml") as fp:
                 meta_yaml = fp.read()
 
+            yaml = YAML()
             if meta_yaml.strip() == "[]" or meta_yaml.strip() == "[ ]":
                 cfg = {}
             else:
-                yaml = YAML()
                 cfg = yaml.load(meta_yaml)
 
             # already done or maybe to False locally
@@ -191,13 +198,10 @@ class RAutomerge(Migrator):
 
             cfg["bot"] = {"automerge": True}
 
-            with Path("conda-forge.yml").open("r") as fp:
+            with ctx.open("conda-forge.yml", "w") as fp:
                 yaml.dump(cfg, fp)
 
-            subprocess.run(
-                ["git", "add", "conda-forge.yml"],
-                check=True,
-            )
+            ctx.git(["add", "conda-forge.yml"])
 
             # did migration, make a commit, no api calls
             # return True, True, False
@@ -18,7 +18,9 @@ def get_org():
 
 
 class RemoveAutomergeAndRerender(Migrator):
-    def migrate(self, feedstock, branch):
+    checkout_paths = [".github/workflows/"]
+
+    def migrate(self, feedstock, branch, ctx):
         make_commit = False
         if os.path.exists(".github/workflows/automerge.yml") or os.path.exists(
             ".github/workflows/webservices.yml"
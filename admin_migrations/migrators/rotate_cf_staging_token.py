@@ -1,6 +1,7 @@
 import os
 import random
 import subprocess
+import tempfile
 
 from conda_smithy.ci_register import travis_get_repo_info
 
@@ -20,8 +21,10 @@ class RotateCFStagingToken(Migrator):
     main_branch_only = True
     max_workers = 1
     max_migrate = 200
+    checkout_paths = []
+    needs_checkout = False
 
-    def migrate(self, feedstock, branch):
+    def migrate(self, feedstock, branch, ctx):
         if random.uniform(0, 1) < 0.5:
             _write_travis_token("TRAVIS_TOKEN_A")
         else:
@@ -37,15 +40,21 @@ class RotateCFStagingToken(Migrator):
             )
             return False, False, True
 
-        subprocess.run(
-            "conda smithy update-binstar-token "
-            "--without-appveyor --without-azure "
-            "--without-circle --without-drone "
-            "--without-github-actions "
-            "--token_name STAGING_BINSTAR_TOKEN",
-            shell=True,
-            check=True,
-        )
+        # conda smithy only needs a directory named after the feedstock since
+        # this migrator runs without a checkout
+        with tempfile.TemporaryDirectory() as tmpdir:
+            feedstock_dir = os.path.join(tmpdir, "%s-feedstock" % feedstock)
+            os.makedirs(feedstock_dir)
+            subprocess.run(
+                "conda smithy update-binstar-token "
+                "--without-appveyor --without-azure "
+                "--without-circle --without-drone "
+                "--without-github-actions "
+                "--token_name STAGING_BINSTAR_TOKEN "
+                "--feedstock_directory %s" % feedstock_dir,
+                shell=True,
+                check=True,
+            )
         print("    rotated staging binstar token", flush=True)
 
         # migration done, make a commit, lots of API calls
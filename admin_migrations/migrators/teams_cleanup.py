@@ -34,6 +34,8 @@ class TeamsCleanup(Migrator):
     main_branch_only = True
     max_processes = 2
     continual = True
+    checkout_paths = []
+    needs_checkout = False
 
     def _should_migrate(self):
         if RNG.random() < _get_random_frac():
@@ -41,7 +43,7 @@ class TeamsCleanup(Migrator):
         else:
             return False
 
-    def migrate(self, feedstock, branch):
+    def migrate(self, feedstock, branch, ctx):
         repo_name = "%s-feedstock" % feedstock
 
         team_name = feedstock.lower()
@@ -41,8 +41,10 @@ class TravisCIAutoCancelPRs(Migrator):
     main_branch_only = True
     max_workers = 1
     max_migrate = 200
+    checkout_paths = []
+    needs_checkout = False
 
-    def migrate(self, feedstock, branch):
+    def migrate(self, feedstock, branch, ctx):
         user = "conda-forge"
         project = "%s-feedstock" % feedstock
 
@@ -6,7 +6,9 @@ from .base import Migrator
 
 
 class TraviCINoOSXAMD64(Migrator):
-    def migrate(self, feedstock, branch):
+    checkout_paths = [".travis.yml"]
+
+    def migrate(self, feedstock, branch, ctx):
         commit = False
         if os.path.exists(".travis.yml"):
             yaml = YAML()
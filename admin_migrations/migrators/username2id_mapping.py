@@ -7,6 +7,8 @@ import subprocess
 import github
 from ruamel.yaml import YAML
 
+from admin_migrations.github_users import get_team_members, get_user_ids
+
 from .base import Migrator
 
 UNAME2ID_FILE = ".recipe_maintainers.json"
@@ -100,9 +102,9 @@ def _add_remove_user(lines, user, action):
 
 class Username2IDMapping(Migrator):
     main_branch_only = True
-    max_processes = 2
+    checkout_paths = [UNAME2ID_FILE]
 
-    def migrate(self, feedstock, branch):
+    def migrate(self, feedstock, branch, ctx):
         if os.path.exists(UNAME2ID_FILE):
             print("    username to id mapping already exists!", flush=True)
             # migration done, make a commit, lots of API calls
@@ -140,21 +142,11 @@ class Username2IDMapping(Migrator):
 
             print("    wrote username to id mapping file", flush=True)
         else:
-            maintainers = {e.login.lower() for e in fs_team.get_members()}
             maint_to_remove = set()
             maint_to_add = set()
 
-            uname2id_mapping = {}
-            for uname in maintainers:
-                try:
-                    uid = gh.get_user(uname).id
-                except github.UnknownObjectException:
-                    print(f"    null user id for {uname}", flush=True)
-                    uid = None
-                    maint_to_remove.add(uname)
-
-                if uid is not None:
-                    uname2id_mapping[uname] = uid
+            # team members always exist, so their IDs come with the team
+            uname2id_mapping = get_team_members("conda-forge", fs_team.slug) or {}
 
             print("    got username to id mapping", flush=True)
 
@@ -181,12 +173,12 @@ class Username2IDMapping(Migrator):
             )
             recipe_maintainers = {m.lower() for m in recipe_maintainers}
             recipe_maintainers = {m for m in recipe_maintainers if "/" not in m}
-            for maint in recipe_maintainers:
-                try:
-                    gh.get_user(maint)
-                except github.UnknownObjectException:
-                    if maint not in uname2id_mapping:
-                        maint_to_remove.add(maint)
+            recipe_maintainer_ids = get_user_ids(
+                recipe_maintainers - set(uname2id_mapping)
+            )
+            for maint, uid in recipe_maintainer_ids.items():
+                if uid is None:
+                    maint_to_remove.add(maint)
 
             for maint in uname2id_mapping:
                 if maint not in recipe_maintainers:
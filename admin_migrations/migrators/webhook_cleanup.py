@@ -13,9 +13,10 @@ def _gh():
 
 class WebhookCleanup(Migrator):
     main_branch_only = True
-    max_processes = 1
+    checkout_paths = []
+    needs_checkout = False
 
-    def migrate(self, feedstock, branch):
+    def migrate(self, feedstock, branch, ctx):
         repo = _gh().get_repo(f"conda-forge/{feedstock}-feedstock")
 
         domains_to_check = [
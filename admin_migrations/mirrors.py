@@ -0,0 +1,99 @@
+import os
+import shutil
+import subprocess
+
+from admin_migrations.defaults import MIRROR_DIR, MIRROR_MAX_BYTES
+from admin_migrations.git_commands import run_git
+
+
+def _mirror_path(feedstock):
+    return os.path.join(MIRROR_DIR, "%s-feedstock.git" % feedstock)
+
+
+def _fetch_mirror(pth, url):
+    run_git(["fetch", "--quiet", "--prune", url, "+refs/heads/*:refs/heads/*"], cwd=pth)
+
+    # keep HEAD pointing at the current default branch
+    for line in run_git(["ls-remote", "--symref", url, "HEAD"])[1].splitlines():
+        if line.startswith("ref: "):
+            run_git(["symbolic-ref", "HEAD", line[len("ref: ") :].split()[0]], cwd=pth)
+            break
+
+
+def _clone_mirror(pth, url):
+    os.makedirs(MIRROR_DIR, exist_ok=True)
+    tmp_pth = pth + ".%d.tmp" % os.getpid()
+    shutil.rmtree(tmp_pth, ignore_errors=True)
+    run_git(["clone", "--quiet", "--bare", url, tmp_pth])
+    # the url has a token in it which we do not want to keep around
+    run_git(["remote", "remove", "origin"], cwd=tmp_pth)
+    os.replace(tmp_pth, pth)
+
+
+def update_mirror(feedstock, url):
+    """Create or incrementally fetch the bare mirror of a feedstock.
+
+    Returns the path to the mirror.
+    """
+    pth = _mirror_path(feedstock)
+    if os.path.exists(pth):
+        try:
+            _fetch_mirror(pth, url)
+        except subprocess.CalledProcessError:
+            print("    mirror fetch failed - recloning", flush=True)
+            shutil.rmtree(pth)
+            _clone_mirror(pth, url)
+    else:
+        _clone_mirror(pth, url)
+
+    # the mtime marks when the mirror was last used for eviction
+    os.utime(pth)
+    return pth
+
+
+def clone_from_mirror(feedstock, url, dest, clone_args=None):
+    """Clone a feedstock into dest using the local mirror.
+
+    The objects are hard-linked from the mirror so this only costs the
+    incremental fetch. The clone's origin points at url afterwards.
+    """
+    mirror = update_mirror(feedstock, url)
+    run_git(["clone", "--quiet"] + (clone_args or []) + [mirror, dest])
+    run_git(["remote", "set-url", "origin", url], cwd=dest)
+
+
+def _dir_size(pth):
+    size = 0
+    for root, _, files in os.walk(pth):
+        for fname in files:
+            try:
+                size += os.lstat(os.path.join(root, fname)).st_size
+            except OSError:
+                pass
+    return size
+
+
+def evict_mirrors(max_bytes=MIRROR_MAX_BYTES):
+    """Remove the least recently used mirrors until they fit in max_bytes."""
+    if MIRROR_DIR is None or not os.path.exists(MIRROR_DIR):
+        return
+
+    mirrors = []
+    for name in os.listdir(MIRROR_DIR):
+        pth = os.path.join(MIRROR_DIR, name)
+        if name.endswith(".git") and os.path.isdir(pth):
+            mirrors.append((os.stat(pth).st_mtime, _dir_size(pth), pth))
+
+    total = sum(size for _, size, _ in mirrors)
+    num_evicted = 0
+    for _, size, pth in sorted(mirrors):
+        if total <= max_bytes:
+            break
+        shutil.rmtree(pth, ignore_errors=True)
+        total -= size
+        num_evicted += 1
+
+    print(
+        "evicted %d feedstock mirrors, %.2f GB left" % (num_evicted, total / 1024**3),
+        flush=True,
+    )
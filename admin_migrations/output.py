@@ -0,0 +1,59 @@
+import contextlib
+import io
+import sys
+import threading
+
+_INSTALL_LOCK = threading.Lock()
+
+
+class _ThreadLocalStream(io.TextIOBase):
+    """A stream that sends writes from threads capturing their output to
+    the thread's buffer and everything else to the wrapped stream."""
+
+    def __init__(self, stream):
+        self._stream = stream
+        self._local = threading.local()
+
+    def _target(self):
+        buff = getattr(self._local, "buff", None)
+        return self._stream if buff is None else buff
+
+    def write(self, s):
+        return self._target().write(s)
+
+    def flush(self):
+        return self._target().flush()
+
+    def isatty(self):
+        return self._target().isatty()
+
+    @property
+    def encoding(self):
+        return self._stream.encoding
+
+
+def _install():
+    with _INSTALL_LOCK:
+        if not isinstance(sys.stdout, _ThreadLocalStream):
+            sys.stdout = _ThreadLocalStream(sys.stdout)
+        if not isinstance(sys.stderr, _ThreadLocalStream):
+            sys.stderr = _ThreadLocalStream(sys.stderr)
+
+
+@contextlib.contextmanager
+def capture_output():
+    """Capture stdout and stderr of the current thread into a StringIO.
+
+    Unlike contextlib.redirect_stdout, this only affects the calling thread
+    so several feedstocks can be migrated at once in one process.
+    """
+    _install()
+    buff = io.StringIO()
+    prev = getattr(sys.stdout._local, "buff", None)
+    sys.stdout._local.buff = buff
+    sys.stderr._local.buff = buff
+    try:
+        yield buff
+    finally:
+        sys.stdout._local.buff = prev
+        sys.stderr._local.buff = prev
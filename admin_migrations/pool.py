@@ -0,0 +1,146 @@
+import concurrent.futures
+import itertools
+import multiprocessing
+import pickle
+import queue
+import threading
+import traceback
+from concurrent.futures.process import BrokenProcessPool
+
+
+def _picklable_exception(e):
+    try:
+        pickle.dumps(e)
+        return e
+    except Exception:
+        return RuntimeError("".join(traceback.format_exception(e)))
+
+
+def _run_tasks(tasks, results):
+    while True:
+        item = tasks.get()
+        if item is None:
+            return
+
+        task_id, fn, args = item
+        try:
+            results.put((task_id, True, fn(*args)))
+        except BaseException as e:
+            results.put((task_id, False, _picklable_exception(e)))
+
+
+def _worker_main(tasks, results, threads_per_worker, initializer, initargs):
+    if initializer is not None:
+        initializer(*initargs)
+
+    threads = [
+        threading.Thread(target=_run_tasks, args=(tasks, results))
+        for _ in range(threads_per_worker)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+
+class ThreadedProcessPool:
+    """An executor that runs tasks on several threads in each of its worker
+    processes.
+
+    The feedstock work mostly waits on git and the network, so a few
+    processes with several threads each keep more feedstocks in flight than
+    one process per feedstock would.
+
+    Parameters
+    ----------
+    max_workers : int
+        The number of worker processes.
+    threads_per_worker : int
+        The number of tasks each worker process runs at once.
+    initializer : callable, optional
+        Called with initargs once in each worker process before any tasks.
+    initargs : tuple, optional
+        The arguments for the initializer.
+    """
+
+    def __init__(self, max_workers, threads_per_worker, initializer=None, initargs=()):
+        self._width = max_workers * threads_per_worker
+        self._tasks = multiprocessing.Queue()
+        self._results = multiprocessing.Queue()
+        self._futures = {}
+        self._lock = threading.Lock()
+        self._ids = itertools.count()
+        self._shutdown = False
+
+        self._procs = [
+            multiprocessing.Process(
+                target=_worker_main,
+                args=(
+                    self._tasks,
+                    self._results,
+                    threads_per_worker,
+                    initializer,
+                    initargs,
+                ),
+                daemon=True,
+            )
+            for _ in range(max_workers)
+        ]
+        for p in self._procs:
+            p.start()
+
+        self._collector = threading.Thread(target=self._collect, daemon=True)
+        self._collector.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.shutdown()
+
+    def submit(self, fn, *args):
+        fut = concurrent.futures.Future()
+        with self._lock:
+            task_id = next(self._ids)
+            self._futures[task_id] = fut
+        self._tasks.put((task_id, fn, args))
+        return fut
+
+    def _fail_all(self, e):
+        with self._lock:
+            futures = list(self._futures.values())
+            self._futures.clear()
+        for fut in futures:
+            fut.set_exception(e)
+
+    def _collect(self):
+        while True:
+            try:
+                item = self._results.get(timeout=1)
+            except queue.Empty:
+                if not self._shutdown and any(not p.is_alive() for p in self._procs):
+                    # the tasks of a dead worker never finish
+                    self._fail_all(BrokenProcessPool("a worker process died"))
+                    return
+                continue
+
+            if item is None:
+                return
+
+            task_id, ok, value = item
+            with self._lock:
+                fut = self._futures.pop(task_id)
+            if ok:
+                fut.set_result(value)
+            else:
+                fut.set_exception(value)
+
+    def shutdown(self):
+        """Wait for the submitted tasks and stop the workers."""
+        self._shutdown = True
+        for _ in range(self._width):
+            self._tasks.put(None)
+        for p in self._procs:
+            p.join()
+        self._results.put(None)
+        self._collector.join()
@@ -0,0 +1,137 @@
+import multiprocessing
+import time
+
+# the GitHub rate limit resources we track, anything else counts as core
+RESOURCES = ("core", "graphql", "search")
+
+# requests left unspent in each window for anything outside of the governor,
+# like the git pushes and the webservices
+RESERVE = {"core": 250, "graphql": 100, "search": 5}
+
+# number of requests that can go out back to back before pacing kicks in
+BURST = 50
+
+# slots of the shared state for each resource
+_REMAINING = 0
+_RESET = 1
+_NEXT_ALLOWED = 2
+_NUM_SLOTS = 3
+
+# the governor used by this process, see install_rate_limiter
+_RATE_LIMITER = None
+
+
+def _resource_for_url(url):
+    if "/graphql" in url:
+        return "graphql"
+    elif "/search/" in url:
+        return "search"
+    else:
+        return "core"
+
+
+class RateLimiter:
+    """A rate limit governor for the GitHub API shared by all processes.
+
+    It keeps the last seen `X-RateLimit-Remaining` and `X-RateLimit-Reset`
+    for each resource in shared memory. Requests are spaced so that the
+    remaining budget lasts until the reset, and are held back entirely when
+    the budget is spent or GitHub sent a `Retry-After` for a secondary rate
+    limit.
+
+    Create it in the parent process and hand it to the workers through the
+    pool initializer.
+    """
+
+    def __init__(self):
+        self._lock = multiprocessing.Lock()
+        # remaining < 0 means we have not seen the headers yet
+        self._state = multiprocessing.Array(
+            "d", [-1.0, 0.0, 0.0] * len(RESOURCES), lock=False
+        )
+        self._blocked_until = multiprocessing.Value("d", 0.0, lock=False)
+
+    def _slot(self, resource, field):
+        return RESOURCES.index(resource) * _NUM_SLOTS + field
+
+    def wait(self, url):
+        """Block until a request to the url is allowed."""
+        resource = _resource_for_url(url)
+        with self._lock:
+            now = time.time()
+            remaining = self._state[self._slot(resource, _REMAINING)]
+            reset = self._state[self._slot(resource, _RESET)]
+            next_allowed = self._state[self._slot(resource, _NEXT_ALLOWED)]
+
+            if remaining < 0 or reset <= now:
+                # nothing known about the current window
+                start = now
+                next_allowed = now
+            elif remaining <= RESERVE[resource]:
+                start = reset
+                next_allowed = reset
+            else:
+                # space the requests evenly over the rest of the window, but
+                # allow short bursts
+                interval = (reset - now) / (remaining - RESERVE[resource])
+                next_allowed = max(next_allowed, now)
+                start = max(now, next_allowed - BURST * interval)
+                next_allowed += interval
+            if remaining > 0:
+                self._state[self._slot(resource, _REMAINING)] = remaining - 1
+
+            start = max(start, self._blocked_until.value)
+            self._state[self._slot(resource, _NEXT_ALLOWED)] = next_allowed
+
+        if start > now:
+            time.sleep(start - now)
+
+    def update(self, url, resp):
+        """Update the budget from the headers of a response."""
+        headers = resp.headers
+        resource = headers.get("X-RateLimit-Resource", _resource_for_url(url))
+        if resource not in RESOURCES:
+            resource = "core"
+
+        with self._lock:
+            now = time.time()
+            if "X-RateLimit-Remaining" in headers and "X-RateLimit-Reset" in headers:
+                remaining = float(headers["X-RateLimit-Remaining"])
+                reset = float(headers["X-RateLimit-Reset"])
+                # do not go back to an older window if responses arrive out
+                # of order
+                if reset >= self._state[self._slot(resource, _RESET)]:
+                    self._state[self._slot(resource, _REMAINING)] = remaining
+                    self._state[self._slot(resource, _RESET)] = reset
+            else:
+                remaining = None
+                reset = None
+
+            if resp.status_code in (403, 429):
+                if "Retry-After" in headers:
+                    try:
+                        until = now + float(headers["Retry-After"])
+                    except ValueError:
+                        until = now + 60
+                elif remaining == 0:
+                    until = reset
+                else:
+                    until = None
+
+                if until is not None and until > self._blocked_until.value:
+                    self._blocked_until.value = until
+                    print(
+                        "    hit the GitHub rate limit - waiting %ds" % (until - now),
+                        flush=True,
+                    )
+
+
+def install_rate_limiter(rate_limiter):
+    """Make the GitHub API requests in this process go through a governor."""
+    global _RATE_LIMITER
+    _RATE_LIMITER = rate_limiter
+
+
+def get_rate_limiter():
+    """Get the governor for this process or None if there is none."""
+    return _RATE_LIMITER
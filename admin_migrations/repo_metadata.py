@@ -0,0 +1,140 @@
+import json
+import os
+import time
+
+from requests.exceptions import RequestException
+
+from admin_migrations.defaults import REPO_METADATA_TTL
+from admin_migrations.http_cache import get_github_session
+
+REPO_METADATA_FNAME = "data/repo_metadata.json"
+
+# the metadata of each feedstock we know about in this process, filled from
+# REPO_METADATA_FNAME on first use and refreshed from the API when stale
+_REPO_METADATA = None
+
+
+def repo_metadata_from_repo(repo):
+    """Get the metadata for a PyGithub repository from the org listing."""
+    return {
+        "archived": repo.archived,
+        "default_branch": repo.default_branch,
+        "pushed_at": (
+            repo.pushed_at.strftime("%Y-%m-%dT%H:%M:%SZ")
+            if repo.pushed_at is not None
+            else None
+        ),
+    }
+
+
+def read_repo_metadata(fname=REPO_METADATA_FNAME):
+    """Read the last listing of the org or None if there is none."""
+    if not os.path.exists(fname):
+        return None
+
+    with open(fname) as fp:
+        return json.load(fp)
+
+
+def write_repo_metadata(repos, updated_at, fname=REPO_METADATA_FNAME):
+    """Write the metadata for the feedstocks from a listing of the org.
+
+    Parameters
+    ----------
+    repos : dict
+        A dict mapping the feedstock name without "-feedstock" to its
+        metadata from `repo_metadata_from_repo`.
+    updated_at : float
+        The time the listing started. Changes after it may not be included.
+    """
+    global _REPO_METADATA
+
+    blob = {
+        "updated_at": updated_at,
+        "repos": repos,
+    }
+    with open(fname + ".tmp", "w") as fp:
+        json.dump(blob, fp, indent=2, sort_keys=True)
+    os.replace(fname + ".tmp", fname)
+    _REPO_METADATA = {
+        name: dict(md, updated_at=blob["updated_at"])
+        for name, md in blob["repos"].items()
+    }
+
+
+def load_repo_metadata(fname=REPO_METADATA_FNAME):
+    """Load the metadata from the last listing of the org into this process.
+
+    Call this from the root of the repo before the migrators change the
+    working directory.
+    """
+    global _REPO_METADATA
+
+    blob = read_repo_metadata(fname=fname)
+    if blob is None:
+        _REPO_METADATA = {}
+        return
+
+    _REPO_METADATA = {
+        name: dict(md, updated_at=blob["updated_at"])
+        for name, md in blob["repos"].items()
+    }
+
+
+def _fetch_repo_metadata(feedstock):
+    headers = {
+        "authorization": "Bearer %s" % os.environ["GITHUB_TOKEN"],
+        "content-type": "application/json",
+    }
+    sess = get_github_session()
+    for _ in range(10):
+        try:
+            r = sess.get(
+                "https://api.github.com/repos/conda-forge/%s-feedstock" % feedstock,
+                headers=headers,
+            )
+            r.raise_for_status()
+            repo = r.json()
+            return {
+                "archived": repo["archived"],
+                "default_branch": repo["default_branch"],
+                "pushed_at": repo["pushed_at"],
+            }
+        except (json.JSONDecodeError, KeyError, RequestException):
+            pass
+    return None
+
+
+def get_repo_metadata(feedstock):
+    """Get the metadata for a feedstock.
+
+    The metadata comes from the last listing of the org. It is only fetched
+    from the API if the feedstock is missing or its metadata is older than
+    REPO_METADATA_TTL seconds.
+
+    Returns
+    -------
+    metadata : dict or None
+        A dict with the keys "archived", "default_branch" and "pushed_at", or
+        None if it could not be fetched.
+    """
+    if _REPO_METADATA is None:
+        load_repo_metadata()
+
+    md = _REPO_METADATA.get(feedstock)
+    if md is None or time.time() - md["updated_at"] > REPO_METADATA_TTL:
+        md = _fetch_repo_metadata(feedstock)
+        if md is None:
+            return None
+        md["updated_at"] = time.time()
+        _REPO_METADATA[feedstock] = md
+
+    return md
+
+
+def repo_is_archived(feedstock):
+    """Return whether a feedstock is archived or None if it is not known."""
+    md = get_repo_metadata(feedstock)
+    if md is None:
+        return None
+    return md["archived"]
@@ -0,0 +1,99 @@
+import math
+import queue
+import time
+
+
+def _timed_call(fn, *args):
+    start = time.time()
+    res = fn(*args)
+    return res, time.time() - start
+
+
+class _Lane:
+    def __init__(self, executor, width, max_in_flight):
+        self.executor = executor
+        self.width = width
+        self.max_in_flight = max_in_flight
+        self.in_flight = 0
+        self.num_done = 0
+        self.total_time = 0.0
+
+    @property
+    def mean_duration(self):
+        if self.num_done == 0:
+            return 0.0
+        return self.total_time / self.num_done
+
+
+class WorkScheduler:
+    """Keep executors saturated with a bounded number of in-flight tasks.
+
+    Each lane wraps an executor and keeps at most queue_depth tasks per
+    worker in flight so that workers never idle between tasks. Completion
+    callbacks put finished tasks on a queue which the caller drains with
+    next_result.
+
+    Parameters
+    ----------
+    deadline : float
+        The time (as from time.time()) by which all work should be done.
+        New tasks are only admitted if they are expected to finish by then.
+    """
+
+    def __init__(self, deadline):
+        self.deadline = deadline
+        self._lanes = {}
+        self._done = queue.Queue()
+
+    def add_lane(self, name, executor, width, queue_depth=2):
+        self._lanes[name] = _Lane(executor, width, width * queue_depth)
+
+    @property
+    def num_in_flight(self):
+        return sum(lane.in_flight for lane in self._lanes.values())
+
+    def has_room(self, name):
+        lane = self._lanes[name]
+        return lane.in_flight < lane.max_in_flight
+
+    def fits(self, name, expected_duration=None):
+        """Return True if a new task in the lane is expected to finish before
+        the deadline.
+
+        The task waits for the tasks already in flight, which are assumed to
+        take the mean duration of the finished tasks in the lane.
+        """
+        lane = self._lanes[name]
+        if expected_duration is None:
+            expected_duration = lane.mean_duration
+        rounds_ahead = math.ceil((lane.in_flight + 1) / lane.width) - 1
+        finish = time.time() + lane.mean_duration * rounds_ahead + expected_duration
+        return finish <= self.deadline
+
+    def submit(self, name, key, fn, *args):
+        lane = self._lanes[name]
+        lane.in_flight += 1
+        fut = lane.executor.submit(_timed_call, fn, *args)
+        fut.add_done_callback(lambda fut: self._done.put((name, key, fut)))
+
+    def next_result(self, block=True):
+        """Get the next finished task.
+
+        Returns a tuple of the lane name, the task key, the result of the task
+        and its duration in seconds, or None if no task is finished (and block
+        is False) or no task is in flight.
+        """
+        if self.num_in_flight == 0:
+            return None
+
+        try:
+            name, key, fut = self._done.get(block=block)
+        except queue.Empty:
+            return None
+
+        lane = self._lanes[name]
+        lane.in_flight -= 1
+        res, duration = fut.result()
+        lane.num_done += 1
+        lane.total_time += duration
+        return name, key, res, duration
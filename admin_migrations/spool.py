@@ -0,0 +1,62 @@
+import fcntl
+import json
+import os
+
+# the migrators run in temporary directories, so the spool is found through
+# an absolute path taken when the code is loaded from the root of the repo
+SPOOL_DIR = os.path.abspath("data/spool")
+
+
+def _spool_path(name):
+    return os.path.join(SPOOL_DIR, "%s.jsonl" % name)
+
+
+def append_to_spool(name, entry):
+    """Queue an entry for work batched across feedstocks.
+
+    Any process can append to a spool at the same time.
+    """
+    os.makedirs(SPOOL_DIR, exist_ok=True)
+    with open(_spool_path(name), "a") as fp:
+        fcntl.flock(fp, fcntl.LOCK_EX)
+        try:
+            fp.write(json.dumps(entry) + "\n")
+            fp.flush()
+        finally:
+            fcntl.flock(fp, fcntl.LOCK_UN)
+
+
+def spool_size(name):
+    """Return the number of entries waiting in a spool."""
+    if not os.path.exists(_spool_path(name)):
+        return 0
+
+    with open(_spool_path(name)) as fp:
+        fcntl.flock(fp, fcntl.LOCK_SH)
+        try:
+            return sum(1 for line in fp if line.strip())
+        finally:
+            fcntl.flock(fp, fcntl.LOCK_UN)
+
+
+def drain_spool(name):
+    """Remove and return all of the entries in a spool."""
+    if not os.path.exists(_spool_path(name)):
+        return []
+
+    entries = []
+    with open(_spool_path(name), "r+") as fp:
+        fcntl.flock(fp, fcntl.LOCK_EX)
+        try:
+            for line in fp:
+                try:
+                    entries.append(json.loads(line))
+                except json.JSONDecodeError:
+                    # a process that was killed mid-write can leave a partial
+                    # line
+                    pass
+            fp.seek(0)
+            fp.truncate()
+        finally:
+            fcntl.flock(fp, fcntl.LOCK_UN)
+    return entries